@@ -1,46 +1,175 @@
-import os 
-import time
+"""
+棋譜を kifs/ に追加する。
+
+    python add_kif_files.py                       # 1局ずつペーストして保存
+    python add_kif_files.py 棋譜.kif フォルダ/ ... # ファイル・フォルダ・アーカイブからまとめて取り込む
+    python add_kif_files.py @一覧.txt              # 1行に1つパスを書いたファイルから取り込む
+    cat *.kif | python add_kif_files.py -         # 標準入力から取り込む
+    python add_kif_files.py --convert フォルダ/    # 取り込んだあと SFEN に変換する
+
+1ファイル・1回の入力に複数局あっても、ヘッダと「まで」の行で1局ずつに分けて保存する。
+ファイル名は指し手の行のハッシュなので、同じ棋譜を何度取り込んでも1つしか増えない。
+"""
+import hashlib
+import os
+import sys
+
+from kif_parser import NUMBERED_RE
+from kif_reader import is_kif_source, iter_games, iter_stream_games, split_games
 
 # フォルダパス
 KIFS_FOLDER = "kifs"
 TRANSLATED_FOLDER = "sfen_maker_1/output_sfens"
 SFEN_OUTPUT = os.path.join(TRANSLATED_FOLDER, "output.sfen")
 
+WRITE_BATCH_SIZE = 500  # これだけ溜まったらまとめて書き込む
+
+
+def normalize_game(lines):
+    """1局分の行から行末の空白と空行を除いたテキストを作る"""
+    return "\n".join(line.rstrip() for line in lines if line.strip()) + "\n"
+
+
+def kif_filename(text):
+    """棋譜の指し手の行から決まるファイル名（ヘッダやコメントが違っても同じ対局なら同じ名前）"""
+    moves = "\n".join(line for line in text.splitlines() if NUMBERED_RE.match(line))
+    digest = hashlib.sha1(moves.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(KIFS_FOLDER, f"kif_{digest}.kif")
+
+
+class KifWriter:
+    """棋譜を指し手のハッシュ名で kifs/ に書き込む（WRITE_BATCH_SIZE 局ごと）"""
+
+    def __init__(self, batch_size=WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.pending = {}  # ファイル名 → テキスト
+        self.written = []
+        self.skipped = 0
+
+    def add(self, lines):
+        """1局を書き込み待ちに加える。指し手がない・すでにある棋譜なら False"""
+        if not any(NUMBERED_RE.match(line) for line in lines):
+            return False
+        text = normalize_game(lines)
+        path = kif_filename(text)
+        if path in self.pending or os.path.exists(path):
+            self.skipped += 1
+            return False
+        self.pending[path] = text
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+        return True
+
+    def flush(self):
+        for path, text in self.pending.items():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(text)
+        self.written.extend(self.pending)
+        if len(self.written) >= self.batch_size:
+            print(f"💾 {len(self.written)} 局を書き込みました")
+        self.pending = {}
+
+
+def iter_source_paths(args):
+    """コマンドライン引数のファイル・フォルダ・@一覧 を棋譜ファイルのパスにする"""
+    for arg in args:
+        if arg.startswith("@"):
+            with open(arg[1:], "r", encoding="utf-8") as f:
+                yield from iter_source_paths(line.strip() for line in f if line.strip())
+        elif os.path.isdir(arg):
+            for root, dirs, files in os.walk(arg):
+                dirs.sort()
+                for filename in sorted(files):
+                    if is_kif_source(filename):
+                        yield os.path.join(root, filename)
+        elif os.path.exists(arg):
+            yield arg
+        else:
+            print(f"⚠️ 見つかりません: {arg}")
+
+
+def iter_source_games(args):
+    """取り込む棋譜を1局ずつ返す（"-" は標準入力）"""
+    kifs_folder = os.path.abspath(KIFS_FOLDER)
+    for arg in args:
+        if arg == "-":
+            yield from iter_stream_games(sys.stdin.buffer, "<stdin>")
+            continue
+        for path in iter_source_paths([arg]):
+            if os.path.abspath(path).startswith(kifs_folder + os.sep):
+                continue  # kifs/ の中のファイルはもう変換の対象
+            for _, lines in iter_games(path):
+                yield lines
+
+
+def ingest(args, convert=False):
+    """まとめて取り込み、新しく保存したファイルのリストを返す"""
+    writer = KifWriter()
+    for lines in iter_source_games(args):
+        writer.add(lines)
+    writer.flush()
+
+    print(f"✅ {len(writer.written)} 局を {KIFS_FOLDER} に保存しました（取り込み済みでスキップ: {writer.skipped}）")
+    if convert and writer.written:
+        run_conversion()
+    return writer.written
+
+
+def run_conversion():
+    """sfen_maker_1/convert_kif.py で新しい棋譜を SFEN に変換する"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "sfen_maker_1"))
+    from convert_kif import process_all_kif
+
+    process_all_kif()
+
+
 # 1. 棋譜をコマンドプロンプトから入力し、ファイルに保存
 def save_kif():
     print("\n📥 棋譜をペーストしてください（終了: Enter 2回 / スクリプト停止: Ctrl+C）:")
     kif_text = []
-    
+
     while True:
         try:
             line = input()
-            if line.strip():  # 空行を無視
-                kif_text.append(line)
-            else:
-                break  # 連続で Enter が押されたら終了
+        except EOFError:
+            break
         except KeyboardInterrupt:
             print("\n🛑 ユーザーが中断しました。終了します。")
             return None
-    
-    if not kif_text:
+        # 棋譜の途中の空行は残し、空行が2回続いたら終了
+        if not line.strip() and kif_text and not kif_text[-1].strip():
+            break
+        kif_text.append(line)
+
+    if not any(line.strip() for line in kif_text):
         print("⚠️ 棋譜が入力されませんでした。再入力してください。")
         return None
-    
-    # 棋譜を新しいファイルとして保存
-    timestamp = time.strftime("%Y%m%d_%H%M%S")
-    kif_filename = os.path.join(KIFS_FOLDER, f"kif_{timestamp}.kif")
-    
-    with open(kif_filename, "w", encoding="utf-8") as f:
-        f.write("\n".join(kif_text))
-    
-    print(f"✅ 棋譜を保存しました: {kif_filename}")
-    return kif_filename
+
+    writer = KifWriter()
+    for lines in split_games(kif_text):
+        writer.add(lines)
+    writer.flush()
+
+    for path in writer.written:
+        print(f"✅ 棋譜を保存しました: {path}")
+    if writer.skipped:
+        print(f"🔁 保存済みの棋譜です（{writer.skipped} 局）")
+    return writer.written
 
 # メイン処理
 def main():
     os.makedirs(KIFS_FOLDER, exist_ok=True)
     os.makedirs(TRANSLATED_FOLDER, exist_ok=True)
 
+    args = sys.argv[1:]
+    convert = "--convert" in args
+    sources = [arg for arg in args if arg != "--convert"]
+    if not sources and not sys.stdin.isatty():
+        sources = ["-"]  # パイプで渡された
+    if sources:
+        ingest(sources, convert)
+        return
+
     try:
         while True:
             save_kif()  # 棋譜を連続で入力
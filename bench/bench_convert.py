@@ -0,0 +1,69 @@
+"""
+棋譜 → USI 変換のスループット計測（合成棋譜を使う）。
+
+- convert_kif: sfen_maker_1/convert_kif.py の clean_kifu → process_sfen を1局ずつ
+- translate:   sfen_maker_2/translate.py を別プロセスで実行（全局の指し手を1ファイルにまとめて）
+
+    python bench/bench_convert.py [対局数 ...]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.join(ROOT_DIR, "sfen_maker_1"))
+
+from bench_results import record_result
+from convert_kif import clean_kifu, process_sfen
+from gen_kif import ensure_corpus
+
+DEFAULT_SIZES = (100, 1000)
+TRANSLATE_SCRIPT = os.path.join(ROOT_DIR, "sfen_maker_2", "translate.py")
+
+
+def count_moves(sfen):
+    return len(sfen.split()) - 3  # "position startpos moves" の3語を除く
+
+
+def bench_convert_kif(paths):
+    start = time.perf_counter()
+    n_moves = 0
+    for path in paths:
+        n_moves += count_moves(process_sfen(clean_kifu(path)))
+    record_result("convert_kif", len(paths), n_moves, time.perf_counter() - start, "手")
+
+
+def bench_translate(paths):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "cleaned_kif.txt")
+        output_path = os.path.join(tmp_dir, "converted_sfen.txt")
+        with open(input_path, "w", encoding="utf-8") as f:
+            for path in paths:
+                f.writelines(line + "\n" for line in clean_kifu(path) if "投了" not in line)
+
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, TRANSLATE_SCRIPT, input_path, output_path],
+            stdout=subprocess.DEVNULL, check=True,
+        )
+        elapsed = time.perf_counter() - start
+
+        with open(output_path, "r", encoding="utf-8") as f:
+            n_moves = count_moves(f.read())
+    record_result("translate", len(paths), n_moves, elapsed, "手")
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for n_games in sizes:
+        paths = ensure_corpus(n_games)
+        bench_convert_kif(paths)
+        bench_translate(paths)
+
+
+if __name__ == "__main__":
+    main()
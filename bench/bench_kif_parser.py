@@ -0,0 +1,55 @@
+"""
+kif_parser のスループット計測。
+
+kifs/ の棋譜を繰り返して大きなコーパスを作り、1局ずつ USI に変換する速さを測る。
+
+    python bench/bench_kif_parser.py [対局数]
+"""
+import glob
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from bench_results import record_result
+from kif_parser import iter_usi_moves
+
+DEFAULT_GAMES = 10000
+
+
+def load_sample_games():
+    """kifs/ の棋譜を行のリストとして読み込む"""
+    games = []
+    for path in sorted(glob.glob(os.path.join(ROOT_DIR, "kifs", "*.kif"))):
+        with open(path, "r", encoding="utf-8") as f:
+            games.append(f.read().splitlines())
+    return games
+
+
+def main():
+    n_games = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_GAMES
+    samples = load_sample_games()
+    if not samples:
+        print("⚠️ kifs/ に棋譜がありません。")
+        return
+
+    corpus = [samples[i % len(samples)] for i in range(n_games)]
+    n_lines = sum(len(game) for game in corpus)
+
+    start = time.perf_counter()
+    n_moves = 0
+    for game in corpus:
+        for _ in iter_usi_moves(game):
+            n_moves += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"対局数: {n_games}  行数: {n_lines}  指し手: {n_moves}")
+    print(f"時間: {elapsed:.3f}s")
+    print(f"{n_games / elapsed:,.0f} 局/s  {n_moves / elapsed:,.0f} 手/s  {n_lines / elapsed:,.0f} 行/s")
+    record_result("kif_parser", n_games, n_moves, elapsed, "手")
+
+
+if __name__ == "__main__":
+    main()
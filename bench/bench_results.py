@@ -0,0 +1,64 @@
+"""
+ベンチマーク結果の保存と比較。
+
+結果は bench/results.jsonl に1件1行で追記する。同じベンチマーク・同じ規模の
+前回の結果より REGRESSION_THRESHOLD 以上遅くなっていたら警告を出す。
+"""
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+from tsume_store import append_record, iter_records
+
+RESULTS_FILE = os.path.join(BENCH_DIR, "results.jsonl")
+REGRESSION_THRESHOLD = 0.2  # 前回より 20% 以上遅ければ警告
+
+
+def git_revision():
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_result(name, size, path=RESULTS_FILE):
+    """同じベンチマーク・同じ規模の最新の結果"""
+    previous = None
+    for entry in iter_records(path):
+        if entry.get("name") == name and entry.get("size") == size:
+            previous = entry
+    return previous
+
+
+def record_result(name, size, count, seconds, unit, path=RESULTS_FILE):
+    """結果を表示して保存し、前回より遅くなっていれば警告する"""
+    rate = count / seconds if seconds else 0.0
+    previous = previous_result(name, size, path)
+    print(f"⏱️ {name} (規模 {size}): {seconds:.3f}s  {rate:,.0f} {unit}/s")
+    if previous and previous["rate"] and rate < previous["rate"] * (1 - REGRESSION_THRESHOLD):
+        print(
+            f"⚠️ 前回 ({previous.get('revision')}) の {previous['rate']:,.0f} {unit}/s より"
+            f" {1 - rate / previous['rate']:.0%} 遅くなっています"
+        )
+
+    append_record({
+        "name": name,
+        "size": size,
+        "count": count,
+        "seconds": round(seconds, 6),
+        "rate": round(rate, 3),
+        "unit": unit,
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }, path)
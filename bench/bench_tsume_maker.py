@@ -0,0 +1,64 @@
+"""
+tsume_maker の探索ループ全体のスループット計測。
+
+合成棋譜の各手の局面を fake_usi_engine.py に送り、局面の変換・エンジンとの
+やり取り・結果の解析を含めた1局面あたりの速さを測る（df-pn とキャッシュは使わない）。
+
+    python bench/bench_tsume_maker.py [局面数 ...]
+
+エンジン台数は TSUME_ENGINE_POOL_SIZE、偽エンジンの遅延や結果の割合は
+FAKE_ENGINE_LATENCY_MS / FAKE_ENGINE_RESULTS で変えられる。
+"""
+import itertools
+import os
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+# 起動中のエンジンデーモンがあっても使わない
+os.environ["TSUME_DAEMON_SOCKET"] = os.path.join(BENCH_DIR, "no_daemon.sock")
+
+import tsume_maker
+from bench_results import record_result
+from gen_kif import ensure_corpus
+from kif_parser import iter_usi_moves
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+CORPUS_GAMES = 200  # 局面を取り出す対局数（足りなければ繰り返す）
+FAKE_ENGINE = os.path.join(ROOT_DIR, "fake_usi_engine.py")
+
+
+def corpus_positions(paths):
+    """各対局の各手の局面を `position startpos moves ...` で返す"""
+    positions = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            moves = list(iter_usi_moves(f))
+        for ply in range(1, len(moves) + 1):
+            positions.append("position startpos moves " + " ".join(moves[:ply]))
+    return positions
+
+
+def bench_solve(positions, size):
+    sfen_list = list(itertools.islice(itertools.cycle(positions), size))
+    start = time.perf_counter()
+    tsume_maker.solve_positions(sfen_list, pool_size=tsume_maker.ENGINE_POOL_SIZE)
+    record_result("tsume_maker", size, size, time.perf_counter() - start, "局面")
+
+
+def main():
+    tsume_maker.ENGINE_PATH = FAKE_ENGINE
+    tsume_maker.DFPN_SCREEN = False
+    tsume_maker.QUIET = True
+
+    positions = corpus_positions(ensure_corpus(CORPUS_GAMES))
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for size in sizes:
+        bench_solve(positions, size)
+
+
+if __name__ == "__main__":
+    main()
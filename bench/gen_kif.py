@@ -0,0 +1,164 @@
+"""
+ベンチマーク用の合成 KIF 棋譜を作る。
+
+shogi_board の合法手からランダムに対局を進めて KIF を書き出す。
+パーサが扱う表記をひととおり含むよう、駒を取る手（次の手が「同」になる）・
+成り/不成・駒打ちを選びやすくし、一部の対局は長手数にする。
+
+    python bench/gen_kif.py 出力フォルダ [対局数] [乱数の種]
+"""
+import os
+import random
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from shogi_board import (
+    BISHOP,
+    BLACK,
+    GOLD,
+    KING,
+    KNIGHT,
+    LANCE,
+    PAWN,
+    PROMOTE,
+    ROOK,
+    SILVER,
+    Board,
+    piece_type,
+)
+
+DEFAULT_GAMES = 100
+CORPUS_DIR = os.path.join(ROOT_DIR, "bench", "corpus")  # ベンチマークで使い回す棋譜
+MIN_PLIES = 40
+MAX_PLIES = 160
+LONG_GAME_RATE = 0.1  # 長手数の対局の割合
+LONG_MAX_PLIES = 400
+
+# 手を選ぶときの重み
+CAPTURE_WEIGHT = 6
+PROMOTE_WEIGHT = 4
+DROP_WEIGHT = 2
+
+KIF_PIECE_NAMES = {
+    PAWN: "歩", LANCE: "香", KNIGHT: "桂", SILVER: "銀",
+    BISHOP: "角", ROOK: "飛", GOLD: "金", KING: "玉",
+    PAWN + PROMOTE: "と", LANCE + PROMOTE: "成香", KNIGHT + PROMOTE: "成桂",
+    SILVER + PROMOTE: "成銀", BISHOP + PROMOTE: "馬", ROOK + PROMOTE: "龍",
+}
+KIF_FILES = "０１２３４５６７８９"
+KIF_RANKS = "〇一二三四五六七八九"
+
+HEADER = [
+    "開始日時：2025/01/01 00:00:00",
+    "棋戦：合成棋譜",
+    "手合割：平手",
+    "先手：bench_black",
+    "後手：bench_white",
+    "手数----指手---------消費時間--",
+]
+
+
+def move_weight(board, move):
+    from_sq, to_sq, promote, drop = move
+    weight = 1
+    if board.squares[to_sq]:
+        weight *= CAPTURE_WEIGHT
+    if promote:
+        weight *= PROMOTE_WEIGHT
+    if drop:
+        weight *= DROP_WEIGHT
+    return weight
+
+
+def kif_move_text(board, move, last_dst, legal):
+    """内部の指し手を KIF の表記（７六歩(77) / 同　歩(76) / ５五角打 など）にする"""
+    from_sq, to_sq, promote, drop = move
+    if to_sq == last_dst:
+        dst = "同　"
+    else:
+        dst = KIF_FILES[to_sq // 9 + 1] + KIF_RANKS[to_sq % 9 + 1]
+
+    if drop:
+        return f"{dst}{KIF_PIECE_NAMES[drop]}打"
+
+    text = dst + KIF_PIECE_NAMES[piece_type(board.squares[from_sq])]
+    if promote:
+        text += "成"
+    elif (from_sq, to_sq, True, 0) in legal:
+        text += "不成"
+    return text + f"({from_sq // 9 + 1}{from_sq % 9 + 1})"
+
+
+def generate_game(rng, max_plies):
+    """1局分の KIF の行を作る"""
+    board = Board.startpos()
+    lines = list(HEADER)
+    last_dst = None
+
+    for ply in range(1, max_plies + 1):
+        legal = board.legal_moves()
+        if not legal:
+            winner = "後手" if board.side == BLACK else "先手"
+            lines.append(f"まで{ply - 1}手で{winner}の勝ち")
+            return lines
+        move = rng.choices(legal, [move_weight(board, m) for m in legal])[0]
+        text = kif_move_text(board, move, last_dst, set(legal))
+        lines.append(f"{ply:>4} {text}   (00:01/00:00:01)")
+        board.do_move(move)
+        last_dst = move[1]
+
+    lines.append(f"{max_plies + 1:>4} 投了")
+    winner = "先手" if board.side == BLACK else "後手"
+    lines.append(f"まで{max_plies}手で{winner}の勝ち")
+    return lines
+
+
+def generate_games(n_games, seed=0):
+    """n_games 局分の KIF の行を順に返す"""
+    rng = random.Random(seed)
+    for _ in range(n_games):
+        if rng.random() < LONG_GAME_RATE:
+            max_plies = rng.randint(MAX_PLIES, LONG_MAX_PLIES)
+        else:
+            max_plies = rng.randint(MIN_PLIES, MAX_PLIES)
+        yield generate_game(rng, max_plies)
+
+
+def write_corpus(folder, n_games, seed=0):
+    """1局1ファイルで書き出し、ファイルのパスのリストを返す"""
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for idx, lines in enumerate(generate_games(n_games, seed)):
+        path = os.path.join(folder, f"bench_{seed}_{idx:06d}.kif")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        paths.append(path)
+    return paths
+
+
+def ensure_corpus(n_games, seed=0):
+    """CORPUS_DIR に n_games 局の合成棋譜を用意し（あれば使い回す）、パスのリストを返す"""
+    folder = os.path.join(CORPUS_DIR, f"seed{seed}_{n_games}")
+    paths = [os.path.join(folder, f"bench_{seed}_{idx:06d}.kif") for idx in range(n_games)]
+    if all(os.path.exists(path) for path in paths):
+        return paths
+    print(f"🧪 合成棋譜を {n_games} 局作ります: {folder}")
+    return write_corpus(folder, n_games, seed)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(f"使い方: python {sys.argv[0]} 出力フォルダ [対局数] [乱数の種]")
+        return
+    folder = sys.argv[1]
+    n_games = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_GAMES
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+
+    paths = write_corpus(folder, n_games, seed)
+    print(f"✨ {len(paths)} 局の合成棋譜を作りました: {folder}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+対局の終盤の各手から詰将棋の候補局面を取り出す。
+
+convert_kif が作った `position startpos moves ...` の1局ごとに、
+最後の LAST_PLIES 手分の局面を作り、エンジンに送る前に
+Python 側の軽い事前チェックで明らかに詰まない局面を落とす。
+全対局は手順木（move_trie.py）にまとめてからたどるので、共通の序盤は1回だけ再現する。
+たどりながら指し手の合法性も確かめ（move_validator.py）、不正な手のある対局は隔離する。
+
+    python candidate_extractor.py [入力.sfen] [出力.sfen]
+"""
+import os
+import sys
+
+from move_trie import MoveTrie
+from move_validator import QUARANTINE_FILE, no_moves_record, quarantine, validate_trie
+from shogi_board import HAND_PIECES, KING, piece_color, piece_type
+
+# === ユーザー設定 ===
+LAST_PLIES = 8  # 終局から何手分の局面を候補にするか
+MIN_SUPPORT = 2  # 持ち駒がないとき、玉の周りに必要な攻め駒の利きの数
+
+INPUT_FILE = "sfen_maker_1/output_sfens/output.sfen"
+CANDIDATE_FILE = "sfen_maker_1/output_sfens/candidates.sfen"
+
+
+def king_zone(sq):
+    """玉のいるマスと周囲8マス"""
+    file, rank = sq // 9, sq % 9
+    for df in (-1, 0, 1):
+        for dr in (-1, 0, 1):
+            f, r = file + df, rank + dr
+            if 0 <= f < 9 and 0 <= r < 9:
+                yield f * 9 + r
+
+
+def count_support(board, color, king_sq):
+    """color の駒が敵玉の周囲に利いている数"""
+    zone = set(king_zone(king_sq))
+    support = 0
+    for sq in range(81):
+        piece = board.squares[sq]
+        if not piece or piece_color(piece) != color or piece_type(piece) == KING:
+            continue
+        support += sum(1 for to_sq in board.attack_targets(sq) if to_sq in zone)
+    return support
+
+
+def prefilter(board):
+    """エンジンに送る価値のある局面か調べ、(合否, 理由) を返す"""
+    attacker = board.side
+    king_sq = board.king_square(attacker ^ 1)
+    if king_sq is None:
+        return False, "玉がいない"
+    if board.in_check(attacker):
+        return False, "攻め方に王手がかかっている"
+
+    hand_count = sum(board.hands[attacker][ptype] for ptype in HAND_PIECES)
+    if not hand_count and count_support(board, attacker, king_sq) < MIN_SUPPORT:
+        return False, "玉の周りに攻め駒が足りない"
+
+    # 王手が1つもなければ詰みは絶対にない
+    if not board.check_moves():
+        return False, "王手がない"
+    return True, "ok"
+
+
+def extract_all(sfen_list, last_plies=LAST_PLIES, sources=None, validate=True):
+    """複数の対局から候補局面を集める
+
+    対局は手順木にまとめ、共通の序盤は盤上で1回だけ再現する。
+    不正な手のある対局は候補から外し、QUARANTINE_FILE に隔離する
+    （validate_games で確かめ済みの対局なら validate=False で確かめ直さない）。
+    sources に辞書を渡すと、候補局面 → 元の対局 を書き込む。
+    """
+    trie = MoveTrie()
+    records = []  # 隔離する対局
+    for sfen in sfen_list:
+        sfen = sfen.strip()
+        if sfen.startswith("position") and " moves" in sfen:
+            trie.add(sfen)
+        elif sfen and validate:
+            records.append(no_moves_record(sfen))
+
+    found = []  # (ノード, 候補局面)
+
+    def in_last_plies(node):
+        # この局面が、通る対局のどれかの最後の last_plies 手分に入っているか
+        return trie.depth[node] + last_plies - 1 >= trie.shortest_length[node]
+
+    def visit(node, board):
+        if not in_last_plies(node):
+            return
+        ok, _ = prefilter(board)
+        if ok:
+            found.append((node, trie.position(node)))
+
+    if not validate:
+        bad_games = {}
+        for node, board in trie.walk():
+            visit(node, board)
+    else:
+        bad_games = validate_trie(trie, visit)
+    records += [
+        {"position": trie.game(game), "ply": ply, "move": move, "reason": reason}
+        for game, (ply, move, reason) in sorted(bad_games.items())
+    ]
+    if records:
+        added = quarantine(records)
+        print(f"🚧 不正な手のある {len(records)} 局を除きました（{QUARANTINE_FILE} に新しく {added} 局）")
+    if bad_games:
+        # 元の対局は合法な対局からだけ選ぶ（同じノードを不正な対局も通ることがある）
+        trie.recount_shortest(bad_games)
+        found = [(node, candidate) for node, candidate in found if in_last_plies(node)]
+
+    candidates = []
+    games = {}  # 葉 ID → 元の対局（同じ対局の候補で文字列を共有する）
+    for node, candidate in found:
+        game = trie.shortest_game[node]
+        candidates.append(candidate)
+        if sources is not None and candidate not in sources:
+            if game not in games:
+                games[game] = trie.game(game)
+            sources[candidate] = games[game]
+    return candidates
+
+
+def main():
+    input_file = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+    output_file = sys.argv[2] if len(sys.argv) > 2 else CANDIDATE_FILE
+
+    if not os.path.exists(input_file):
+        print(f"⚠️ {input_file} が見つかりません。")
+        return
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        sfen_list = f.readlines()
+
+    candidates = extract_all(sfen_list)
+
+    with open(output_file, "w", encoding="utf-8") as f:
+        for candidate in candidates:
+            f.write(candidate + "\n")
+
+    print(f"✨ {len(sfen_list)} 局から {len(candidates)} 局面を候補にしました: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+engine_daemon への接続（クライアント側）。
+
+デーモンとは Unix ソケット上で1行1つの JSON をやり取りする:
+
+    → {"cmd": "solve", "positions": ["position ...", ...]}
+    ← {"idx": 0, "result": [詰み手数, 次善手の詰み手数, 手順], "status": "mate",
+       "time_ms": 100, "elapsed_ms": 12}   （決着するたびに1行）
+    ← {"done": true}
+
+    → {"cmd": "status"} / {"cmd": "configure", "pool_size": 2, ...} / {"cmd": "shutdown"}
+    ← 応答1行
+
+エラーのときは {"error": "..."} が返る。
+"""
+import asyncio
+import json
+import os
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DAEMON_SOCKET = os.environ.get(
+    "TSUME_DAEMON_SOCKET", os.path.join(SCRIPT_DIR, "engine_daemon.sock")
+)
+LINE_LIMIT = 1 << 26  # 1行（1リクエスト）の最大バイト数
+
+
+class DaemonError(Exception):
+    """デーモンがエラーを返した・接続が切れた"""
+
+
+def daemon_available(socket_path=DAEMON_SOCKET):
+    """デーモンのソケットがあるか（Unix ソケットが使えない環境では常に False）"""
+    return hasattr(asyncio, "open_unix_connection") and os.path.exists(socket_path)
+
+
+def encode_message(message):
+    return (json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def read_message(reader):
+    """1行読んで JSON にする（接続が切れたら None）"""
+    raw = await reader.readline()
+    if not raw:
+        return None
+    return json.loads(raw)
+
+
+async def _open(socket_path):
+    return await asyncio.open_unix_connection(socket_path, limit=LINE_LIMIT)
+
+
+async def request(message, socket_path=DAEMON_SOCKET):
+    """応答が1行だけのコマンドを送り、応答を返す"""
+    reader, writer = await _open(socket_path)
+    try:
+        writer.write(encode_message(message))
+        await writer.drain()
+        reply = await read_message(reader)
+    finally:
+        writer.close()
+    if reply is None:
+        raise DaemonError("デーモンとの接続が切れました")
+    if "error" in reply:
+        raise DaemonError(reply["error"])
+    return reply
+
+
+async def solve_via_daemon(items, record, socket_path=DAEMON_SOCKET):
+    """[(idx, sfen), ...] をデーモンで調べる
+
+    決着するたびに record(idx, sfen, 結果, 判定の種類, 持ち時間ms, 探索時間ms) を呼ぶ。
+    エンジンの異常で調べられなかった局面を [(idx, sfen), ...] で返す。
+    """
+    reader, writer = await _open(socket_path)
+    try:
+        writer.write(encode_message({"cmd": "solve", "positions": [sfen for _, sfen in items]}))
+        await writer.drain()
+        while True:
+            reply = await read_message(reader)
+            if reply is None:
+                raise DaemonError("デーモンとの接続が切れました")
+            if "error" in reply:
+                raise DaemonError(reply["error"])
+            if reply.get("done"):
+                return [items[i] for i in reply.get("failed", [])]
+            idx, sfen = items[reply["idx"]]
+            record(
+                idx,
+                sfen,
+                tuple(reply["result"]),
+                reply["status"],
+                reply["time_ms"],
+                reply["elapsed_ms"],
+            )
+    finally:
+        writer.close()
@@ -0,0 +1,225 @@
+"""
+短手数の詰みを調べる df-pn 探索（Python 実装）。
+
+エンジンに送る前の一次ふるいとして使う。短い詰みはここで確定させ、
+詰みがないことを証明できた局面もここで落とし、
+決着がつかなかった局面だけを YaneuraOu に回す。
+
+結果は parse_mate_info と同じ (詰み手数, 次善手の詰み手数, 手順) の形で返す。
+"""
+from position_cache import STATUS_MATE, STATUS_NOMATE, STATUS_YOZUME
+from shogi_board import move_to_usi
+
+# === ユーザー設定 ===
+DFPN_MAX_DEPTH = 5  # 何手詰めまで調べるか（奇数）
+DFPN_NODE_LIMIT = 3000  # 1局面あたりの探索ノード数の上限
+
+# 判定の種類（position_cache の STATUS_* に加えて）
+STATUS_NO_SHORT_MATE = "no_short_mate"  # DFPN_MAX_DEPTH 手以内の詰みはない
+STATUS_UNKNOWN = "unknown"  # ノード数の上限に達した
+
+INF = 10 ** 9
+
+
+class NodeLimitExceeded(Exception):
+    """探索ノード数が上限に達した"""
+
+
+class DfpnSolver:
+    """深さ制限つき df-pn。置換表は (局面, 残り深さ) → (pn, dn, 深さ打ち切りの有無)"""
+
+    def __init__(self, node_limit=DFPN_NODE_LIMIT):
+        self.node_limit = node_limit
+        self.nodes = 0
+        self.table = {}
+
+    @staticmethod
+    def _key(board, depth):
+        return (
+            bytes(board.squares),
+            bytes(board.hands[0]),
+            bytes(board.hands[1]),
+            board.side,
+            depth,
+        )
+
+    def _lookup(self, key):
+        return self.table.get(key, (1, 1, False))
+
+    def _children(self, board, moves, depth):
+        """各指し手と、指した後の局面の置換表キー"""
+        children = []
+        for move in moves:
+            captured = board.do_move(move)
+            children.append((move, self._key(board, depth - 1)))
+            board.undo_move(move, captured)
+        return children
+
+    def mid(self, board, th_pn, th_dn, depth, or_node):
+        """(th_pn, th_dn) を超えるまで局面を展開する"""
+        self.nodes += 1
+        if self.nodes > self.node_limit:
+            raise NodeLimitExceeded()
+
+        key = self._key(board, depth)
+
+        if or_node:
+            if depth <= 0:
+                self.table[key] = (INF, 0, True)
+                return
+            moves = board.check_moves()
+            if not moves:
+                self.table[key] = (INF, 0, False)
+                return
+        else:
+            if depth <= 0:
+                # 残り深さがなければ、逃げる手があるかどうかだけ見る
+                if board.has_legal_move():
+                    self.table[key] = (INF, 0, True)
+                else:
+                    self.table[key] = (0, INF, False)
+                return
+            moves = board.legal_moves()
+            if not moves:
+                self.table[key] = (0, INF, False)
+                return
+
+        children = self._children(board, moves, depth)
+
+        while True:
+            entries = [self._lookup(child_key) for _, child_key in children]
+
+            if or_node:
+                pn = min(e[0] for e in entries)
+                dn = min(INF, sum(e[1] for e in entries))
+            else:
+                pn = min(INF, sum(e[0] for e in entries))
+                dn = min(e[1] for e in entries)
+
+            if pn >= th_pn or dn >= th_dn:
+                cut = False
+                if pn >= INF:
+                    # 不詰の証明が深さの打ち切りに頼っているか
+                    if or_node:
+                        cut = any(e[2] for e in entries)
+                    else:
+                        cut = all(e[2] for e in entries if e[0] >= INF)
+                self.table[key] = (pn, dn, cut)
+                return
+
+            # 最善の子と次善の子を選ぶ
+            score = 0 if or_node else 1
+            order = sorted(range(len(entries)), key=lambda i: entries[i][score])
+            best = order[0]
+            second = entries[order[1]][score] if len(order) > 1 else INF
+            best_pn, best_dn, _ = entries[best]
+
+            if or_node:
+                child_th_pn = min(th_pn, second + 1)
+                child_th_dn = th_dn - dn + best_dn
+            else:
+                child_th_pn = th_pn - pn + best_pn
+                child_th_dn = min(th_dn, second + 1)
+
+            move = children[best][0]
+            captured = board.do_move(move)
+            self.mid(board, child_th_pn, child_th_dn, depth - 1, not or_node)
+            board.undo_move(move, captured)
+
+    def prove(self, board, depth, or_node=True):
+        """局面を証明・反証する。(pn, dn, cut) を返す"""
+        self.mid(board, INF, INF, depth, or_node)
+        return self._lookup(self._key(board, depth))
+
+    def mate_length(self, board, max_depth, or_node=True):
+        """この局面の最短の詰み手数（max_depth 手以内で詰まなければ None）"""
+        for depth in range(1 if or_node else 0, max_depth + 1, 2):
+            if self.prove(board, depth, or_node)[0] == 0:
+                return depth
+        return None
+
+    def principal_variation(self, board, depth):
+        """証明済みの局面から詰み手順を取り出す
+
+        攻め方は最短で詰む手、玉方は最も長く逃げられる手を選ぶ。各手の詰み手数は
+        浅い深さから prove() し直して確かめる（置換表にない深さを推測しない）。
+        """
+        pv = []
+        board = board.copy()
+        or_node = True
+        while True:
+            moves = board.check_moves() if or_node else board.legal_moves()
+            if not moves:
+                break
+            chosen, chosen_length = None, None
+            for move in moves:
+                captured = board.do_move(move)
+                length = self.mate_length(board, depth - 1, not or_node)
+                board.undo_move(move, captured)
+                if length is None:
+                    if not or_node:
+                        # 詰まない逃げ方がある（証明と合わない）
+                        return pv
+                    continue
+                if chosen is None or (length < chosen_length if or_node else length > chosen_length):
+                    chosen, chosen_length = move, length
+            if chosen is None:
+                break
+            pv.append(chosen)
+            board.do_move(chosen)
+            depth = chosen_length
+            or_node = not or_node
+        return pv
+
+def mated_after_check(board, max_depth, node_limit=DFPN_NODE_LIMIT):
+    """王手を指した後の局面（玉方の手番）が、玉方のどの応手にも max_depth 手以内に詰むか
+
+    True / False / None（ノード数の上限で決着しない）を返す。
+    """
+    solver = DfpnSolver(node_limit)
+    try:
+        pn, _, _ = solver.prove(board.copy(), max_depth, or_node=False)
+    except NodeLimitExceeded:
+        return None
+    return pn == 0
+
+
+def solve_mate(board, max_depth=DFPN_MAX_DEPTH, node_limit=DFPN_NODE_LIMIT):
+    """短手数の詰みを調べ、(判定の種類, (詰み手数, 次善手の詰み手数, 手順)) を返す"""
+    solver = DfpnSolver(node_limit)
+    board = board.copy()
+    no_result = (None, None, "")
+
+    try:
+        for depth in range(1, max_depth + 1, 2):
+            pn, dn, cut = solver.prove(board, depth)
+            if pn >= INF:
+                if not cut:
+                    # 深さの打ち切りなしで反証できた → そもそも詰みがない
+                    return STATUS_NOMATE, no_result
+                continue
+
+            pv = solver.principal_variation(board, depth)
+            if len(pv) != depth:
+                # 手順を取り出せなかった詰みは採用しない
+                return STATUS_UNKNOWN, no_result
+            steps_str = " ".join(move_to_usi(move) for move in pv)
+
+            # 余詰め: 初手以外の王手でも同じ手数で詰むか
+            mate2 = None
+            for move in board.check_moves():
+                if move == pv[0]:
+                    continue
+                captured = board.do_move(move)
+                child_pn, _, _ = solver.prove(board, depth - 1, or_node=False)
+                board.undo_move(move, captured)
+                if child_pn == 0:
+                    mate2 = depth
+                    break
+
+            status = STATUS_YOZUME if mate2 == depth else STATUS_MATE
+            return status, (depth, mate2, steps_str)
+    except NodeLimitExceeded:
+        return STATUS_UNKNOWN, no_result
+
+    return STATUS_NO_SHORT_MATE, no_result
@@ -0,0 +1,224 @@
+"""
+YaneuraOu を起動したまま待機させておくエンジンデーモン。
+
+tsume_maker を実行するたびにエンジンの起動・評価関数の読み込み・置換表の確保を
+やり直さずに済むよう、初期化済みのエンジンを常駐させ、Unix ソケットで
+局面を受け付ける。ソケットがあれば tsume_maker は自動でデーモンを使う。
+
+    python engine_daemon.py serve                 # デーモンを起動
+    python engine_daemon.py status                # 状態を表示
+    python engine_daemon.py config pool_size=4 hash_mb=1024 threads=8
+    python engine_daemon.py stop                  # デーモンを止める
+
+プロトコルは daemon_client を参照。リクエストは1つずつ順番に処理する。
+"""
+import asyncio
+import json
+import os
+import sys
+
+from daemon_client import (
+    DAEMON_SOCKET,
+    LINE_LIMIT,
+    DaemonError,
+    encode_message,
+    read_message,
+    request,
+)
+from tsume_maker import (
+    ENGINE_HASH_TOTAL_MB,
+    ENGINE_POOL_SIZE,
+    ENGINE_THREADS_TOTAL,
+    search_positions,
+    start_engine,
+)
+from usi_client import EngineError
+
+# config で変更できる項目（すべてプール全体の値）
+CONFIG_KEYS = ("pool_size", "threads", "hash_mb")
+
+
+class EngineDaemon:
+    """初期化済みエンジンのプールを持ち、ソケットからの依頼を処理する"""
+
+    def __init__(self, socket_path=DAEMON_SOCKET):
+        self.socket_path = socket_path
+        self.config = {
+            "pool_size": ENGINE_POOL_SIZE,
+            "threads": ENGINE_THREADS_TOTAL,
+            "hash_mb": ENGINE_HASH_TOTAL_MB,
+        }
+        self.engines = []
+        self.started = 0  # これまでに起動したエンジンの数（名前の通し番号）
+        self.solved = 0
+        self.lock = asyncio.Lock()
+        self.server = None
+        self.stopped = asyncio.Event()
+
+    def engine_resources(self):
+        """エンジン1台あたりの (Threads, USI_Hash MB)"""
+        pool_size = self.config["pool_size"]
+        threads = max(1, self.config["threads"] // pool_size)
+        hash_mb = max(1, self.config["hash_mb"] // pool_size)
+        return threads, hash_mb
+
+    async def _start_one(self):
+        threads, hash_mb = self.engine_resources()
+        name = f"daemon{self.started}"
+        self.started += 1
+        return await start_engine(name, threads, hash_mb)
+
+    async def ensure_engines(self):
+        """落ちたエンジンを起動し直し、台数を pool_size に合わせる"""
+        for engine in self.engines:
+            if not engine.alive:
+                print(f"💥 [{engine.name}] エンジンが終了していたので再起動します")
+                await engine.restart()
+
+        while len(self.engines) > self.config["pool_size"]:
+            await self.engines.pop().quit()
+
+        missing = self.config["pool_size"] - len(self.engines)
+        if missing > 0:
+            self.engines.extend(
+                await asyncio.gather(*(self._start_one() for _ in range(missing)))
+            )
+
+    async def apply_resources(self):
+        """起動中のエンジンに Threads / USI_Hash を設定し直す"""
+        threads, hash_mb = self.engine_resources()
+
+        async def apply(engine):
+            await engine.setoption("Threads", threads)
+            await engine.setoption("USI_Hash", hash_mb)
+            await engine.isready()
+
+        await asyncio.gather(*(apply(engine) for engine in self.engines))
+        print(f"⚙️ エンジン {len(self.engines)} 台 (Threads={threads}, USI_Hash={hash_mb}MB)")
+
+    async def solve(self, positions, writer):
+        """局面を調べ、決着するたびに結果を1行ずつ返す"""
+        items = list(enumerate(positions))
+
+        def record(idx, sfen, result, status, time_ms, elapsed_ms):
+            self.solved += 1
+            writer.write(encode_message({
+                "idx": idx,
+                "result": list(result),
+                "status": status,
+                "time_ms": time_ms,
+                "elapsed_ms": elapsed_ms,
+            }))
+
+        # 落ちたエンジンは局面ごとに再起動してやり直す。それでもだめな局面は failed で返す
+        await self.ensure_engines()
+        failed = await search_positions(self.engines, items, record)
+        if failed:
+            print(f"⚠️ エンジンの異常で調べられなかった局面: {len(failed)}")
+        writer.write(encode_message({"done": True, "failed": [idx for idx, _ in failed]}))
+
+    async def configure(self, message):
+        changes = {key: int(message[key]) for key in CONFIG_KEYS if key in message}
+        if any(value < 1 for value in changes.values()):
+            raise ValueError("設定値は1以上にしてください")
+        self.config.update(changes)
+        await self.ensure_engines()
+        await self.apply_resources()
+        return {"ok": True, "config": self.config}
+
+    def status(self):
+        return {
+            "config": self.config,
+            "engines": [engine.name for engine in self.engines if engine.alive],
+            "restarts": sum(engine.restarts for engine in self.engines),
+            "retries": sum(engine.retries for engine in self.engines),
+            "solved": self.solved,
+        }
+
+    async def handle(self, reader, writer):
+        """1つの接続から1つのリクエストを読んで処理する"""
+        try:
+            message = await read_message(reader)
+            if message is None:
+                return
+            cmd = message.get("cmd")
+            async with self.lock:
+                try:
+                    if cmd == "solve":
+                        await self.solve(message["positions"], writer)
+                    elif cmd == "configure":
+                        writer.write(encode_message(await self.configure(message)))
+                    elif cmd == "status":
+                        writer.write(encode_message(self.status()))
+                    elif cmd == "shutdown":
+                        writer.write(encode_message({"ok": True}))
+                        self.stopped.set()
+                    else:
+                        writer.write(encode_message({"error": f"不明なコマンド: {cmd}"}))
+                except (EngineError, KeyError, ValueError, TypeError) as e:
+                    writer.write(encode_message({"error": str(e)}))
+            await writer.drain()
+        except (ConnectionError, json.JSONDecodeError) as e:
+            print(f"⚠️ クライアントとの通信に失敗しました: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)  # 前回異常終了したときのソケット
+
+        await self.ensure_engines()
+        self.server = await asyncio.start_unix_server(
+            self.handle, self.socket_path, limit=LINE_LIMIT
+        )
+        print(f"🟢 エンジンデーモン起動: {self.socket_path}")
+        try:
+            await self.stopped.wait()
+        finally:
+            self.server.close()
+            await self.server.wait_closed()
+            await asyncio.gather(*(engine.quit() for engine in self.engines))
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            print("🛑 エンジンデーモン終了")
+
+
+def parse_config_args(args):
+    """["pool_size=4", "hash_mb=1024"] → {"pool_size": 4, "hash_mb": 1024}"""
+    config = {}
+    for arg in args:
+        key, _, value = arg.partition("=")
+        if key not in CONFIG_KEYS or not value.isdigit():
+            raise ValueError(f"{arg} は指定できません（{', '.join(CONFIG_KEYS)}）")
+        config[key] = int(value)
+    return config
+
+
+def main():
+    if not hasattr(asyncio, "start_unix_server"):
+        print("⚠️ この環境では Unix ソケットが使えないため、デーモンは起動できません。")
+        return
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "serve"
+    try:
+        if command == "serve":
+            try:
+                asyncio.run(EngineDaemon().serve())
+            except KeyboardInterrupt:
+                print("\n🛑 ユーザーが中断しました。")
+        elif command == "status":
+            print(json.dumps(asyncio.run(request({"cmd": "status"})), ensure_ascii=False, indent=2))
+        elif command == "config":
+            message = {"cmd": "configure", **parse_config_args(sys.argv[2:])}
+            print(json.dumps(asyncio.run(request(message)), ensure_ascii=False, indent=2))
+        elif command == "stop":
+            asyncio.run(request({"cmd": "shutdown"}))
+            print("✅ デーモンを停止しました")
+        else:
+            print(f"使い方: python {os.path.basename(__file__)} [serve|status|config KEY=VALUE...|stop]")
+    except (OSError, DaemonError, ValueError) as e:
+        print(f"⚠️ {e}")
+
+
+if __name__ == "__main__":
+    main()
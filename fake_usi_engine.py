@@ -0,0 +1,141 @@
+"""
+本物の YaneuraOu なしで tsume_maker を動かすための偽 USI エンジン。
+
+TSUME_ENGINE_PATH=fake_usi_engine.py を指定すると tsume_maker から起動される。
+局面文字列のハッシュから「詰み / 詰みなし / 時間切れ」を決定的に返す。
+YaneuraOu の詰将棋探索と同じく、go mate には `checkmate <手順>` だけを返す
+（MultiPV の info 行は出さないので、次善手の詰み手数は分からない）。
+
+環境変数で振る舞いを変えられる（ベンチマーク用）:
+
+    FAKE_ENGINE_LATENCY_MS   1局面あたりの応答遅延（ミリ秒）
+    FAKE_ENGINE_RESULTS      結果の割合 "mate=2,nomate=2,timeout=0"
+    FAKE_ENGINE_SCRIPT       局面ごとの応答を決める JSONL ファイル。1行に
+                             {"position": "position sfen ...", "mate": 3, "latency_ms": 50}
+                             のように書く（"mate": null なら詰みなし、"timeout": true なら
+                             時間切れ、"crash": true なら go mate で異常終了）
+"""
+import json
+import os
+import sys
+import time
+import zlib
+
+# 1局面あたりの応答遅延（ミリ秒）
+LATENCY_MS = int(os.environ.get("FAKE_ENGINE_LATENCY_MS", "0"))
+RESULTS = os.environ.get("FAKE_ENGINE_RESULTS", "mate=2,nomate=2,timeout=0")
+SCRIPT_FILE = os.environ.get("FAKE_ENGINE_SCRIPT")
+NPS = 1000000  # info 行で報告する探索速度
+
+# 手順として返すダミーの指し手
+DUMMY_PV = ["G*5b", "4a5b", "S*4b", "5b6a", "4b5a+", "6a7b", "B*8c", "7b8c", "R*8d"]
+
+
+def reply(line):
+    """標準出力に1行書き出す"""
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def parse_weights(text):
+    """"mate=1,nomate=2" → [("mate", 1), ("nomate", 2)]"""
+    weights = []
+    for item in text.split(","):
+        kind, _, weight = item.partition("=")
+        if int(weight or 0) > 0:
+            weights.append((kind.strip(), int(weight)))
+    return weights
+
+
+def load_script(path):
+    """FAKE_ENGINE_SCRIPT を読み、局面 → 応答の辞書にする"""
+    script = {}
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    script[entry["position"]] = entry
+    return script
+
+
+WEIGHTS = parse_weights(RESULTS)
+SCRIPT = load_script(SCRIPT_FILE)
+
+
+def fake_verdict(position):
+    """局面から (詰み手数, 遅延ms) を決める
+
+    詰みなしは詰み手数が None、時間切れは詰み手数が "timeout"。
+    """
+    entry = SCRIPT.get(position)
+    if entry is not None:
+        mate1 = "timeout" if entry.get("timeout") else entry.get("mate")
+        return mate1, entry.get("latency_ms", LATENCY_MS)
+
+    h = zlib.crc32(position.encode("utf-8"))
+    mate_length = (h // 1024) % 4 * 2 + 1  # 1, 3, 5, 7
+    slot = h % sum(weight for _, weight in WEIGHTS)
+    for kind, weight in WEIGHTS:
+        if slot < weight:
+            break
+        slot -= weight
+    if kind == "mate":
+        return mate_length, LATENCY_MS
+    if kind == "timeout":
+        return "timeout", LATENCY_MS
+    return None, LATENCY_MS
+
+
+def go_mate(position, time_ms):
+    """go mate への応答を出力する（持ち時間より遅ければ timeout）"""
+    mate1, latency_ms = fake_verdict(position)
+    entry = SCRIPT.get(position)
+    if entry is not None and entry.get("crash"):
+        os._exit(1)  # エンジンが落ちたときの再起動を試すため
+    if mate1 == "timeout" or latency_ms > time_ms:
+        time.sleep(time_ms / 1000)
+        reply("checkmate timeout")
+        return
+    if latency_ms:
+        time.sleep(latency_ms / 1000)
+
+    if mate1 is None:
+        reply("checkmate nomate")
+        return
+
+    pv = " ".join(DUMMY_PV[:mate1])
+    nodes = max(1, latency_ms) * NPS // 1000
+    stats = f"time {latency_ms} nodes {nodes} nps {NPS} hashfull {min(1000, nodes // 1000)}"
+    reply(f"info {stats}")
+    reply(f"checkmate {pv}")
+
+
+def main():
+    position = "position startpos"
+
+    for line in sys.stdin:
+        cmd = line.strip()
+        if not cmd:
+            continue
+
+        if cmd == "usi":
+            reply("id name FakeUSIEngine")
+            reply("id author tsume_maker")
+            reply("usiok")
+        elif cmd == "isready":
+            reply("readyok")
+        elif cmd.startswith("position"):
+            position = cmd
+        elif cmd.startswith("go mate"):
+            arg = cmd.split()[2] if len(cmd.split()) > 2 else "infinite"
+            time_ms = int(arg) if arg.isdigit() else 10 ** 9
+            go_mate(position, time_ms)
+        elif cmd.startswith("go"):
+            reply("bestmove resign")
+        elif cmd == "quit":
+            break
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+KIF 棋譜 → USI 指し手のストリーミングパーサ。
+
+指し手の行を1つのコンパイル済み正規表現で読み、USI の指し手を1手ずつ返す。
+同・成/不成・打・成駒（成香/成桂/成銀/と/馬/龍）に対応する。
+
+    from kif_parser import kif_to_position
+    with open(path, encoding="utf-8") as f:
+        print(kif_to_position(f))
+"""
+import re
+
+# 手数 + 行き先（または 同）+ 駒 + 成/不成 + 打 + (移動元)
+MOVE_RE = re.compile(
+    r"^\s*(\d+)\s+"
+    r"(?:([１-９1-9])([一二三四五六七八九])|同[\s　]*)"
+    r"(成香|成桂|成銀|[歩香桂銀金角飛玉王と杏圭全馬龍竜])"
+    r"(不成|成)?"
+    r"(打)?"
+    r"(?:\(([1-9])([1-9])\))?"
+)
+
+# 手数のあとに終局の理由が来る行（投了・切れ負けなど）
+TERMINAL_RE = re.compile(
+    r"^\s*\d+\s+(?:投了|中断|切れ負け|時間切れ|千日手|持将棋|詰み|不詰|反則|入玉|勝ち宣言)"
+)
+# 手数で始まる行（指し手として読めなければエラー）
+NUMBERED_RE = re.compile(r"^\s*\d+\s+\S")
+
+FILE_DIGITS = {
+    "１": "1", "２": "2", "３": "3", "４": "4", "５": "5",
+    "６": "6", "７": "7", "８": "8", "９": "9",
+}
+RANK_LETTERS = {
+    "一": "a", "二": "b", "三": "c", "四": "d", "五": "e",
+    "六": "f", "七": "g", "八": "h", "九": "i",
+}
+DIGIT_RANKS = "_abcdefghi"
+
+# 打てる駒 → USI 英字
+DROP_PIECES = {
+    "歩": "P", "香": "L", "桂": "N", "銀": "S",
+    "金": "G", "角": "B", "飛": "R",
+}
+
+
+class KifParseError(ValueError):
+    """指し手として読めない行"""
+
+    def __init__(self, line_no, line, reason):
+        super().__init__(f"{line_no}行目: {reason}: {line.strip()}")
+        self.line_no = line_no
+        self.line = line
+
+
+def parse_move(match, last_dst):
+    """MOVE_RE のマッチを USI の指し手にする。(指し手, 行き先) を返す"""
+    _, file, rank, piece, action, drop, src_file, src_rank = match.groups()
+
+    if file:
+        dst = FILE_DIGITS.get(file, file) + RANK_LETTERS[rank]
+    elif last_dst:
+        dst = last_dst
+    else:
+        raise ValueError("「同」の前に指し手がありません")
+
+    if drop:
+        letter = DROP_PIECES.get(piece)
+        if letter is None:
+            raise ValueError(f"{piece} は打てません")
+        return f"{letter}*{dst}", dst
+
+    if not src_file:
+        raise ValueError("移動元がありません")
+
+    usi = src_file + DIGIT_RANKS[int(src_rank)] + dst
+    if action == "成":
+        usi += "+"
+    return usi, dst
+
+
+def iter_usi_moves(lines):
+    """KIF の行を読み、USI の指し手を1手ずつ返す（終局の行で止まる）"""
+    last_dst = None
+    for line_no, line in enumerate(lines, start=1):
+        if not line or line[0] in "*#&":
+            continue  # コメント・しおり
+
+        match = MOVE_RE.match(line)
+        if match is None:
+            if line.startswith("まで") or TERMINAL_RE.match(line):
+                return  # 投了・切れ負けなど
+            if NUMBERED_RE.match(line):
+                raise KifParseError(line_no, line, "指し手を読めません")
+            continue  # ヘッダなど
+
+        try:
+            usi, last_dst = parse_move(match, last_dst)
+        except ValueError as e:
+            raise KifParseError(line_no, line, str(e)) from None
+        yield usi
+
+
+def moves_to_position(moves):
+    """USI の指し手の並びを `position startpos moves ...` にする"""
+    return "position startpos moves " + " ".join(moves)
+
+
+def kif_to_position(lines):
+    """KIF の行から `position startpos moves ...` を作る（指し手がなければ None）"""
+    moves = list(iter_usi_moves(lines))
+    if not moves:
+        return None
+    return moves_to_position(moves)
@@ -0,0 +1,151 @@
+"""
+大きな KIF アーカイブを少ないメモリで読むためのリーダ。
+
+- 文字コードを判定する（Shift_JIS/CP932 の .kif と UTF-8 の .kifu）
+- 大きなファイルは mmap して1行ずつ読む
+- zip / tar は展開せずにメンバーを順に読む
+- 1ファイルに複数局あっても、ヘッダと「まで」の行で1局ずつに分ける
+
+1局ずつ (名前, 行のリスト) を返すので、アーカイブの大きさに関係なく
+メモリに載るのは常に1局分だけになる。
+
+    for name, lines in iter_games("games.zip"):
+        print(name, kif_to_position(lines))
+"""
+import mmap
+import os
+import tarfile
+import zipfile
+
+from kif_parser import NUMBERED_RE
+
+MMAP_THRESHOLD = 1 << 20  # これより大きいファイルは mmap で読む
+SAMPLE_SIZE = 1 << 14  # 文字コード判定に使う先頭バイト数
+
+KIF_EXTENSIONS = (".kif", ".kifu")
+TAR_EXTENSIONS = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+ARCHIVE_EXTENSIONS = (".zip",) + TAR_EXTENSIONS
+
+
+def detect_encoding(sample, name=""):
+    """先頭のバイト列とファイル名から文字コードを決める"""
+    if sample.startswith(b"\xef\xbb\xbf"):
+        return "utf-8-sig"
+    if name.lower().endswith(".kifu"):
+        return "utf-8"
+    try:
+        sample.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as e:
+        # 末尾で多バイト文字が切れただけなら UTF-8
+        if e.start >= len(sample) - 3 and e.reason == "unexpected end of data":
+            return "utf-8"
+    return "cp932"
+
+
+def _decode_lines(raw_lines, encoding):
+    for raw in raw_lines:
+        yield raw.decode(encoding, errors="replace").rstrip("\r\n")
+
+
+def _is_header(line):
+    """対局のヘッダ行（開始日時：… など）か"""
+    return "：" in line and not NUMBERED_RE.match(line) and not line.startswith("*")
+
+
+def split_games(lines):
+    """行の並びを1局ずつに分ける（変化手順は読み飛ばす）"""
+    game = []
+    has_moves = False
+    in_variation = False
+    for line in lines:
+        if line.startswith("変化"):
+            if has_moves:
+                yield game
+            game, has_moves, in_variation = [], False, True
+            continue
+        if in_variation:
+            if not _is_header(line):
+                continue
+            in_variation = False
+
+        # 指し手のあとにヘッダが来たら次の対局
+        if has_moves and _is_header(line):
+            yield game
+            game, has_moves = [], False
+
+        game.append(line)
+        if NUMBERED_RE.match(line):
+            has_moves = True
+        elif line.startswith("まで"):
+            yield game
+            game, has_moves = [], False
+
+    if has_moves:
+        yield game
+
+
+def _iter_mmap_lines(path):
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            yield from iter(mm.readline, b"")
+
+
+def iter_file_games(path):
+    """1つの KIF ファイルから1局ずつ返す"""
+    size = os.path.getsize(path)
+    if size == 0:
+        return
+
+    with open(path, "rb") as f:
+        encoding = detect_encoding(f.read(SAMPLE_SIZE), path)
+
+    if size >= MMAP_THRESHOLD:
+        yield from split_games(_decode_lines(_iter_mmap_lines(path), encoding))
+    else:
+        with open(path, "r", encoding=encoding, errors="replace") as f:
+            yield from split_games(line.rstrip("\n") for line in f)
+
+
+def iter_stream_games(stream, name):
+    """バイナリストリーム（アーカイブのメンバー・標準入力）から1局ずつ返す"""
+    encoding = detect_encoding(stream.peek(SAMPLE_SIZE)[:SAMPLE_SIZE], name)
+    yield from split_games(_decode_lines(stream, encoding))
+
+
+def iter_zip_games(path):
+    with zipfile.ZipFile(path) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or not info.filename.lower().endswith(KIF_EXTENSIONS):
+                continue
+            with zf.open(info) as stream:
+                for idx, game in enumerate(iter_stream_games(stream, info.filename)):
+                    yield f"{path}!{info.filename}#{idx}", game
+
+
+def iter_tar_games(path):
+    # "r|*" はシークせずに先頭から順に読むストリームモード
+    with tarfile.open(path, "r|*") as tf:
+        for member in tf:
+            if not member.isfile() or not member.name.lower().endswith(KIF_EXTENSIONS):
+                continue
+            stream = tf.extractfile(member)
+            for idx, game in enumerate(iter_stream_games(stream, member.name)):
+                yield f"{path}!{member.name}#{idx}", game
+
+
+def iter_games(path):
+    """ファイルまたはアーカイブから (名前, 1局分の行) を順に返す"""
+    lower = path.lower()
+    if lower.endswith(".zip"):
+        yield from iter_zip_games(path)
+    elif lower.endswith(TAR_EXTENSIONS):
+        yield from iter_tar_games(path)
+    else:
+        for idx, game in enumerate(iter_file_games(path)):
+            yield f"{path}#{idx}", game
+
+
+def is_kif_source(filename):
+    """変換の対象になるファイル（棋譜またはアーカイブ）か"""
+    return filename.lower().endswith(KIF_EXTENSIONS + ARCHIVE_EXTENSIONS)
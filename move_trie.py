@@ -0,0 +1,197 @@
+"""
+対局の手順をまとめる手順木（トライ）。
+
+output.sfen の各行は `position startpos moves ...` の全手順を毎回持っているが、
+同じ定跡で始まる対局は序盤の手順がほとんど同じ。手順木に入れると共通の手順は
+1回しか持たず、各対局は「最後の手のノード番号」（葉 ID）だけで表せる。
+ノードは配列（親・指し手・深さ・最初の子・次の兄弟）だけで持ち（子は兄弟の並びを
+たどって探す）、指し手の文字列は番号に置き換えて1回だけ保存する。
+
+walk() は木を深さ優先でたどり、盤面は枝分かれのところでだけ複製するので、
+共通の手順は盤上で1回しか再現しない。
+"""
+from array import array
+
+from shogi_board import Board
+
+NO_NODE = -1
+NO_LENGTH = 2**31 - 1  # どの対局も通らないノードの shortest_length
+
+
+class MoveTrie:
+    """対局の手順木。add() した対局は葉 ID（0, 1, 2, ...）で引ける"""
+
+    def __init__(self):
+        # 指し手の文字列 ⇔ 番号
+        self.move_codes = []
+        self.move_ids = {}
+        # 開始局面（`position startpos` など）ごとの根ノード
+        self.heads = []
+        self.roots = {}
+        # ノードの配列（添字 = ノード番号）
+        self.parent = array("i")
+        self.move = array("i")
+        self.depth = array("i")
+        self.first_child = array("i")
+        self.next_sibling = array("i")
+        self.shortest_length = array("i")  # このノードを通る対局の最短の手数
+        self.shortest_game = array("i")  # その対局の葉 ID
+        # 対局ごとの最後の手のノード
+        self.leaves = array("i")
+
+    def __len__(self):
+        return len(self.leaves)
+
+    @property
+    def node_count(self):
+        return len(self.parent)
+
+    def _new_node(self, parent, move_id, depth):
+        node = len(self.parent)
+        self.parent.append(parent)
+        self.move.append(move_id)
+        self.depth.append(depth)
+        self.first_child.append(NO_NODE)
+        self.next_sibling.append(NO_NODE)
+        self.shortest_length.append(NO_LENGTH)
+        self.shortest_game.append(NO_NODE)
+        return node
+
+    def _child(self, node, move_id, depth):
+        """node から move_id で進んだ子ノード（なければ作る）"""
+        child = self.first_child[node]
+        if child == NO_NODE:
+            child = self._new_node(node, move_id, depth)
+            self.first_child[node] = child
+            return child
+        while True:
+            if self.move[child] == move_id:
+                return child
+            sibling = self.next_sibling[child]
+            if sibling == NO_NODE:
+                break
+            child = sibling
+        # 兄弟の並びは追加した順（walk() で先に入れた対局から調べるため末尾につなぐ）
+        sibling = self._new_node(node, move_id, depth)
+        self.next_sibling[child] = sibling
+        return sibling
+
+    def _intern(self, move):
+        move_id = self.move_ids.get(move)
+        if move_id is None:
+            move_id = len(self.move_codes)
+            self.move_codes.append(move)
+            self.move_ids[move] = move_id
+        return move_id
+
+    def _update_shortest(self, node, length, game):
+        if length < self.shortest_length[node]:
+            self.shortest_length[node] = length
+            self.shortest_game[node] = game
+
+    def add(self, position):
+        """`position ... moves ...` の1局を入れて葉 ID を返す（手順がなければ ValueError）"""
+        tokens = position.split()
+        if "moves" not in tokens:
+            raise ValueError(f"手順がありません: {position}")
+        idx = tokens.index("moves")
+        head = " ".join(tokens[:idx])
+        moves = tokens[idx + 1:]
+
+        game = len(self.leaves)
+        node = self.roots.get(head)
+        if node is None:
+            node = self._new_node(NO_NODE, len(self.heads), 0)
+            self.roots[head] = node
+            self.heads.append(head)
+
+        length = len(moves)
+        self._update_shortest(node, length, game)
+        for depth, move in enumerate(moves, start=1):
+            node = self._child(node, self._intern(move), depth)
+            self._update_shortest(node, length, game)
+
+        self.leaves.append(node)
+        return game
+
+    def recount_shortest(self, skip_games):
+        """skip_games の対局を除いて shortest_length / shortest_game を数え直す
+
+        どの対局も通らなくなったノードは shortest_game が NO_NODE になる。
+        """
+        for node in range(self.node_count):
+            self.shortest_length[node] = NO_LENGTH
+            self.shortest_game[node] = NO_NODE
+        for game, leaf in enumerate(self.leaves):
+            if game in skip_games:
+                continue
+            length = self.depth[leaf]
+            node = leaf
+            while node != NO_NODE:
+                self._update_shortest(node, length, game)
+                node = self.parent[node]
+
+    def moves(self, node):
+        """根からこのノードまでの指し手の列"""
+        moves = []
+        while self.parent[node] != NO_NODE:
+            moves.append(self.move_codes[self.move[node]])
+            node = self.parent[node]
+        moves.reverse()
+        return moves
+
+    def head(self, node):
+        """このノードの開始局面（`position startpos` など）"""
+        while self.parent[node] != NO_NODE:
+            node = self.parent[node]
+        return self.heads[self.move[node]]
+
+    def position(self, node):
+        """このノードの局面を `position ... moves ...` で返す"""
+        return f"{self.head(node)} moves {' '.join(self.moves(node))}".rstrip()
+
+    def game(self, game):
+        """葉 ID の対局の全手順"""
+        return self.position(self.leaves[game])
+
+    def walk(self, on_error=None, check=None):
+        """全ノードを深さ優先で (ノード, 盤面) と返す
+
+        盤面は次の yield までしか使えない（呼び出し側で進めたら戻すこと）。
+        再現できない指し手があれば、その先の枝は飛ばして on_error(ノード, 例外) を呼ぶ。
+        check(盤面, 指し手) を渡すと指す前に呼び、理由の文字列が返れば同じく飛ばす。
+        """
+        stack = []
+        for head, root in self.roots.items():
+            try:
+                board = Board.from_position(head)
+            except ValueError as e:
+                if on_error is not None:
+                    on_error(root, e)
+                continue
+            stack.append((root, board))
+
+            while stack:
+                node, board = stack.pop()
+                yield node, board
+
+                # 最初の子を最後に積んで先に調べる。盤面の複製は2番目以降の子の分だけ
+                children = []
+                child = self.first_child[node]
+                while child != NO_NODE:
+                    children.append(child)
+                    child = self.next_sibling[child]
+                for i in range(len(children) - 1, -1, -1):
+                    child = children[i]
+                    move = self.move_codes[self.move[child]]
+                    child_board = board if i == 0 else board.copy()
+                    try:
+                        reason = check(child_board, move) if check is not None else None
+                        if reason is not None:
+                            raise ValueError(reason)
+                        child_board.push_usi(move)
+                    except ValueError as e:
+                        if on_error is not None:
+                            on_error(child, e)
+                        continue
+                    stack.append((child, child_board))
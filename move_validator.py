@@ -0,0 +1,217 @@
+"""
+変換した USI 指し手の合法性チェック。
+
+棋譜の変換ミス（移動元の駒違い・取れない駒・打てない場所・二歩など）があると、
+エンジンは position コマンドを黙って拒否するか、実際の対局とは違う局面を探索してしまう。
+ここで各対局の最初の不正な手を見つけ、その対局はエンジンに送る前に隔離する。
+
+validate_games() は全対局を手順木（move_trie.py）にまとめてから1回たどるので、
+共通の序盤は1回だけ調べればよい。
+
+    python move_validator.py [入力.sfen]   # 不正な対局を quarantine.jsonl に移す
+"""
+import os
+import sys
+
+from move_trie import MoveTrie
+from position_cache import game_id
+from shogi_board import (
+    BLACK,
+    GOLD,
+    KING,
+    KNIGHT,
+    LANCE,
+    LETTER_PIECES,
+    PAWN,
+    make_piece,
+    parse_square,
+    piece_color,
+    piece_type,
+)
+from tsume_store import append_record, iter_records
+
+# === ユーザー設定 ===
+INPUT_FILE = "sfen_maker_1/output_sfens/output.sfen"
+QUARANTINE_FILE = "sfen_maker_1/output_sfens/quarantine.jsonl"
+
+
+def _relative_rank(color, sq):
+    """手番側から見た段（1 = 敵陣の一番奥）"""
+    rank = sq % 9 + 1
+    return rank if color == BLACK else 10 - rank
+
+
+def _dead_end(ptype, rank):
+    """その段では動けなくなる駒か（行き所のない駒）"""
+    return (ptype in (PAWN, LANCE) and rank == 1) or (ptype == KNIGHT and rank <= 2)
+
+
+def illegal_reason(board, move):
+    """board の手番で move が指せなければ理由を返す（指せれば None）。盤面は変えない"""
+    color = board.side
+    try:
+        if len(move) == 4 and move[1] == "*":
+            ptype = LETTER_PIECES.get(move[0])
+            to_sq = parse_square(move[2:4])
+            if ptype is None or ptype == KING:
+                return "打てない駒"
+            from_sq, promote = None, False
+        elif len(move) == 4 or (len(move) == 5 and move[4] == "+"):
+            from_sq = parse_square(move[0:2])
+            to_sq = parse_square(move[2:4])
+            ptype, promote = 0, len(move) == 5
+        else:
+            return "指し手の形が不正"
+    except ValueError:
+        return "マスの表記が不正"
+
+    squares = board.squares
+    target = squares[to_sq]
+    if ptype:
+        if target:
+            return "駒のあるマスに打っている"
+        if not board.hands[color][ptype]:
+            return "持ち駒にない駒を打っている"
+        if _dead_end(ptype, _relative_rank(color, to_sq)):
+            return "行き所のない場所に打っている"
+        if ptype == PAWN:
+            pawn = make_piece(color, PAWN)
+            file = to_sq // 9
+            if pawn in squares[file * 9:file * 9 + 9]:
+                return "二歩"
+    else:
+        piece = squares[from_sq]
+        if not piece or piece_color(piece) != color:
+            return "移動元に手番の駒がない"
+        if target and piece_color(target) == color:
+            return "自分の駒のあるマスに動いている"
+        if not board.piece_attacks(piece, from_sq, to_sq):
+            return "その駒は行き先に動けない"
+        moved = piece_type(piece)
+        in_zone = _relative_rank(color, from_sq) <= 3 or _relative_rank(color, to_sq) <= 3
+        if promote and (moved >= GOLD or not in_zone):
+            return "成れない手で成っている"
+        if not promote and _dead_end(moved, _relative_rank(color, to_sq)):
+            return "行き所のない駒になる不成"
+
+    internal = (from_sq, to_sq, promote, ptype)
+    captured = board.do_move(internal)
+    try:
+        if board.in_check(color):
+            return "自玉に王手がかかったまま"
+        if ptype == PAWN and board.in_check() and not board.has_legal_move():
+            return "打ち歩詰め"
+    finally:
+        board.undo_move(internal, captured)
+    return None
+
+
+def validate_trie(trie, visit=None):
+    """手順木の全対局を調べ、不正な手のある対局を {葉 ID: (手数, 指し手, 理由)} で返す
+
+    visit(ノード, 盤面) を渡すと、合法な手順でたどれた局面ごとに呼ぶ。
+    """
+    bad_nodes = {}
+
+    def report(node, error):
+        move = trie.move_codes[trie.move[node]] if trie.depth[node] else ""
+        bad_nodes[node] = (trie.depth[node], move, str(error))
+
+    for node, board in trie.walk(on_error=report, check=illegal_reason):
+        if visit is not None:
+            visit(node, board)
+    return find_bad_games(trie, bad_nodes)
+
+
+def find_bad_games(trie, bad_nodes):
+    """不正な手のノードの先にある対局を {葉 ID: (手数, 指し手, 理由)} で返す"""
+    bad_games = {}
+    if not bad_nodes:
+        return bad_games
+    for game, node in enumerate(trie.leaves):
+        while node != -1:
+            if node in bad_nodes:
+                bad_games[game] = bad_nodes[node]
+                break
+            node = trie.parent[node]
+    return bad_games
+
+
+def no_moves_record(line):
+    """`position ... moves ...` の形でない行を隔離するときの辞書"""
+    return {"position": line, "ply": 0, "move": "", "reason": "手順のない行"}
+
+
+def validate_games(positions):
+    """対局の並びを (合法な対局のリスト, 隔離する対局のリスト) に分ける
+
+    隔離する対局は {"position", "ply", "move", "reason"} の辞書。
+    手順のない行も隔離する（空行は無視する）。
+    """
+    trie = MoveTrie()
+    games = []
+    quarantined = []
+    for position in positions:
+        position = position.strip()
+        if not position:
+            continue
+        if position.startswith("position") and " moves" in position:
+            trie.add(position)
+            games.append(position)
+        else:
+            quarantined.append(no_moves_record(position))
+
+    bad_games = validate_trie(trie)
+    valid = [position for game, position in enumerate(games) if game not in bad_games]
+    quarantined += [
+        {"position": games[game], "ply": ply, "move": move, "reason": reason}
+        for game, (ply, move, reason) in sorted(bad_games.items())
+    ]
+    return valid, quarantined
+
+
+def quarantine(records, path=QUARANTINE_FILE):
+    """隔離した対局を JSONL に追記し、新しく加えた件数を返す
+
+    output.sfen に残っている不正な対局は実行のたびに見つかるので、
+    すでに隔離してある対局（同じ game_id）は追記しない。
+    """
+    known = {game_id(record["position"]) for record in iter_records(path) if "position" in record}
+    added = 0
+    for record in records:
+        key = game_id(record["position"])
+        if key in known:
+            continue
+        known.add(key)
+        append_record(record, path)
+        added += 1
+    return added
+
+
+def main():
+    input_file = sys.argv[1] if len(sys.argv) > 1 else INPUT_FILE
+
+    if not os.path.exists(input_file):
+        print(f"⚠️ {input_file} が見つかりません。")
+        return
+
+    with open(input_file, "r", encoding="utf-8") as f:
+        valid, quarantined = validate_games(f)
+
+    if not quarantined:
+        print(f"✅ {len(valid)} 局すべて合法な手順でした")
+        return
+
+    for record in quarantined:
+        print(f"❌ {record['ply']}手目 {record['move']}: {record['reason']}")
+    added = quarantine(quarantined)
+    tmp_path = input_file + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for position in valid:
+            f.write(position + "\n")
+    os.replace(tmp_path, input_file)
+    print(f"🚧 {len(quarantined)} 局を除きました（{QUARANTINE_FILE} に新しく {added} 局、残り {len(valid)} 局）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+"""
+局面の 256bit パック形式と、固定長レコードの詰将棋ファイル（.bin）。
+
+YaneuraOu の PackedSfen と同じ考え方で、手番・両玉の位置・盤上の駒・持ち駒を
+ハフマン符号で 32 バイトに詰める（駒が 40 枚そろっている局面に限る）。
+これに手数・詰み手数・手順（1手 16bit）を足した 128 バイトの固定長レコードを
+並べたファイルは mmap して i 番目の問題をそのまま読める。
+
+    python packed_position.py pack [入力.json] [出力.bin]     # 入力省略時は puzzles.db から
+    python packed_position.py unpack [入力.bin] [出力.json]
+"""
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+
+from puzzle_db import PuzzleDB
+from shogi_board import (
+    BISHOP,
+    BLACK,
+    GOLD,
+    HAND_PIECES,
+    KING,
+    KNIGHT,
+    LANCE,
+    PAWN,
+    PIECE_LETTERS,
+    LETTER_PIECES,
+    PROMOTE,
+    ROOK,
+    SILVER,
+    WHITE,
+    Board,
+    make_piece,
+    parse_square,
+    piece_color,
+    piece_type,
+    square_name,
+    unpromote,
+)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKED_FILE = os.path.join(SCRIPT_DIR, "tsumeshogi.bin")
+
+PACKED_SIZE = 32  # 256bit
+TOTAL_PIECES = 40
+
+# 駒の種類 → (符号, ビット数)。None は空きマス。盤上の駒は空きマスの 0 と区別するため先頭が 1
+HUFFMAN_CODES = {
+    None: (0b0, 1),
+    PAWN: (0b01, 2),
+    LANCE: (0b0011, 4),
+    KNIGHT: (0b1011, 4),
+    SILVER: (0b0111, 4),
+    BISHOP: (0b011111, 6),
+    ROOK: (0b111111, 6),
+    GOLD: (0b01111, 5),
+}
+
+
+def _code_bits(code, bits):
+    """符号を下位ビットから順の "0"/"1" 文字列にする（デコード表のキー）"""
+    return "".join("1" if code >> i & 1 else "0" for i in range(bits))
+
+
+def _board_tokens():
+    """盤上の1マス分のビット列（符号 + 成り + 先後）→ 駒"""
+    tokens = {_code_bits(*HUFFMAN_CODES[None]): 0}
+    for ptype, code in HUFFMAN_CODES.items():
+        if ptype is None:
+            continue
+        for promoted in ((False,) if ptype == GOLD else (False, True)):
+            for color in (BLACK, WHITE):
+                bits = _code_bits(*code)
+                if ptype != GOLD:
+                    bits += "1" if promoted else "0"
+                tokens[bits + str(color)] = make_piece(color, ptype + PROMOTE if promoted else ptype)
+    return tokens
+
+
+def _hand_tokens():
+    """持ち駒1枚分のビット列（先頭の 1 を省いた符号 + 成り(0) + 先後）→ (先後, 駒の種類)"""
+    tokens = {}
+    for ptype, (code, bits) in HUFFMAN_CODES.items():
+        if ptype is None:
+            continue
+        for color in (BLACK, WHITE):
+            text = _code_bits(code >> 1, bits - 1) + ("" if ptype == GOLD else "0")
+            tokens[text + str(color)] = (color, ptype)
+    return tokens
+
+
+_BOARD_TOKENS = _board_tokens()
+_HAND_TOKENS = _hand_tokens()
+# 符号は接頭辞符号なので、選択肢を並べた正規表現で先頭から1つずつ切り出せる
+_BOARD_RE = re.compile("|".join(_BOARD_TOKENS))
+_HAND_RE = re.compile("|".join(_HAND_TOKENS))
+
+# レコード: パック局面 / 手数 / 詰み手数 / 手順の手数 / 手順（1手 16bit）
+MAX_PV_PLIES = 46
+RECORD = struct.Struct(f"<{PACKED_SIZE}sHBB{MAX_PV_PLIES}H")
+RECORD_SIZE = RECORD.size  # 128
+HEADER = struct.Struct("<8sII")  # マジック / レコード長 / 版
+MAGIC = b"TSUMEPK\0"
+VERSION = 1
+
+
+class _BitWriter:
+    """下位ビットから順に詰める"""
+
+    def __init__(self):
+        self.value = 0
+        self.pos = 0
+
+    def write(self, value, bits):
+        self.value |= value << self.pos
+        self.pos += bits
+
+
+def pack_board(board):
+    """盤を 32 バイトにする。玉がない・駒が 40 枚でない局面は ValueError"""
+    writer = _BitWriter()
+    writer.write(board.side, 1)
+
+    kings = [board.king_square(color) for color in (BLACK, WHITE)]
+    if None in kings:
+        raise ValueError("玉がいない局面はパックできません")
+    for sq in kings:
+        writer.write(sq, 7)
+
+    count = 2
+    for sq in range(81):
+        piece = board.squares[sq]
+        if piece_type(piece) == KING:
+            continue
+        if not piece:
+            writer.write(*HUFFMAN_CODES[None])
+            continue
+        ptype = piece_type(piece)
+        writer.write(*HUFFMAN_CODES[unpromote(ptype)])
+        if unpromote(ptype) != GOLD:
+            writer.write(1 if ptype > KING else 0, 1)
+        writer.write(piece_color(piece), 1)
+        count += 1
+
+    for color in (BLACK, WHITE):
+        for ptype in HAND_PIECES:
+            code, bits = HUFFMAN_CODES[ptype]
+            for _ in range(board.hands[color][ptype]):
+                writer.write(code >> 1, bits - 1)
+                if ptype != GOLD:
+                    writer.write(0, 1)
+                writer.write(color, 1)
+                count += 1
+
+    if count != TOTAL_PIECES or writer.pos != PACKED_SIZE * 8:
+        raise ValueError(f"駒が {TOTAL_PIECES} 枚そろっていない局面はパックできません")
+    return writer.value.to_bytes(PACKED_SIZE, "little")
+
+
+def unpack_board(data, ply=1):
+    """32 バイトから盤を作る。不正なデータは ValueError"""
+    if len(data) != PACKED_SIZE:
+        raise ValueError("不正なパック局面です")
+    # 下位ビットから順の "0"/"1" 文字列にして、正規表現で符号を切り出す
+    bits = format(int.from_bytes(data, "little"), f"0{PACKED_SIZE * 8}b")[::-1]
+
+    board = Board()
+    board.side = int(bits[0])
+    board.ply = ply
+    kings = (int(bits[1:8][::-1], 2), int(bits[8:15][::-1], 2))
+    if max(kings) >= 81 or kings[0] == kings[1]:
+        raise ValueError("不正なパック局面です")
+
+    matches = _BOARD_RE.finditer(bits, 15)
+    pos = 15
+    for sq in range(81):
+        if sq in kings:
+            continue
+        match = next(matches, None)
+        if match is None or match.start() != pos:
+            raise ValueError("不正なパック局面です")
+        board.squares[sq] = _BOARD_TOKENS[match.group()]
+        pos = match.end()
+    for color, sq in zip((BLACK, WHITE), kings):
+        board.squares[sq] = make_piece(color, KING)
+
+    hand_tokens = _HAND_RE.findall(bits, pos)
+    if sum(map(len, hand_tokens)) != len(bits) - pos:
+        raise ValueError("不正なパック局面です")
+    for token in hand_tokens:
+        color, ptype = _HAND_TOKENS[token]
+        board.hands[color][ptype] += 1
+    return board
+
+
+def pack_position(command):
+    """`position ...` または SFEN → (32 バイト, 手数)"""
+    if command.startswith("position"):
+        board = Board.from_position(command)
+    else:
+        board = Board.from_sfen(command)
+    return pack_board(board), board.ply
+
+
+def unpack_position(data, ply=1):
+    """32 バイト → SFEN（`<盤面> <手番> <持ち駒> <手数>`）"""
+    return unpack_board(data, ply).sfen()
+
+
+def encode_move(usi):
+    """USI の指し手 → 16bit（行き先 7bit / 移動元または打つ駒 7bit / 打 / 成）"""
+    if usi[1] == "*":
+        return parse_square(usi[2:4]) | (LETTER_PIECES[usi[0]] << 7) | (1 << 14)
+    move = parse_square(usi[2:4]) | (parse_square(usi[0:2]) << 7)
+    if usi.endswith("+"):
+        move |= 1 << 15
+    return move
+
+
+def decode_move(move):
+    to_sq = move & 0x7F
+    from_field = (move >> 7) & 0x7F
+    if move & (1 << 14):
+        return f"{PIECE_LETTERS[from_field]}*{square_name(to_sq)}"
+    return square_name(from_field) + square_name(to_sq) + ("+" if move & (1 << 15) else "")
+
+
+def pack_record(record):
+    """tsumeshogi.json の1件 → 128 バイト"""
+    packed, ply = pack_position(record.get("sfen") or record["board"])
+    moves = [encode_move(usi) for usi in record["steps"].split()]
+    n_moves = len(moves)
+    if n_moves > MAX_PV_PLIES:
+        raise ValueError(f"手順が {MAX_PV_PLIES} 手を超える問題はパックできません")
+    moves += [0] * (MAX_PV_PLIES - n_moves)
+    return RECORD.pack(packed, ply, record["mate_length"], n_moves, *moves)
+
+
+def unpack_record(data):
+    """128 バイト → tsumeshogi.json の1件（board は `position sfen ...` になる）"""
+    packed, ply, mate_length, n_moves, *moves = RECORD.unpack(data)
+    position = f"position sfen {unpack_position(packed, ply)}"
+    return {
+        "board": position,
+        "sfen": position,
+        "steps": " ".join(decode_move(move) for move in moves[:n_moves]),
+        "mate_length": mate_length,
+    }
+
+
+def write_packed(records, path=PACKED_FILE):
+    """問題を固定長レコードのファイルに書く。(書いた件数, 飛ばした件数) を返す"""
+    written = skipped = 0
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, RECORD_SIZE, VERSION))
+        for record in records:
+            try:
+                f.write(pack_record(record))
+            except (KeyError, ValueError) as e:
+                print(f"⚠️ パックできない問題をスキップ: {e}")
+                skipped += 1
+                continue
+            written += 1
+    os.replace(tmp_path, path)
+    return written, skipped
+
+
+class PackedPuzzles:
+    """固定長レコードのファイルを mmap して i 番目の問題を読む"""
+
+    def __init__(self, path=PACKED_FILE):
+        self.path = path
+        self._file = open(path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, record_size, version = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or record_size != RECORD_SIZE or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} はこの形式のファイルではありません")
+        self._count = (len(self._mm) - HEADER.size) // RECORD_SIZE
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += self._count
+        if not 0 <= idx < self._count:
+            raise IndexError(idx)
+        offset = HEADER.size + idx * RECORD_SIZE
+        return unpack_record(self._mm[offset:offset + RECORD_SIZE])
+
+    def mate_length(self, idx):
+        """局面を復元せずに詰み手数だけを読む（絞り込み用）"""
+        offset = HEADER.size + idx * RECORD_SIZE + PACKED_SIZE + 2
+        return self._mm[offset]
+
+    def __iter__(self):
+        for idx in range(self._count):
+            yield self[idx]
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("pack", "unpack"):
+        print("使い方: python packed_position.py [pack|unpack] [入力] [出力]")
+        return
+
+    if sys.argv[1] == "pack":
+        output_path = sys.argv[3] if len(sys.argv) > 3 else PACKED_FILE
+        if len(sys.argv) > 2:
+            with open(sys.argv[2], "r", encoding="utf-8") as f:
+                written, skipped = write_packed(json.load(f), output_path)
+        else:
+            with PuzzleDB() as db:
+                written, skipped = write_packed(db.iter_records(), output_path)
+        print(f"✨ {written} 件をパックしました: {output_path}（スキップ {skipped} 件）")
+    else:
+        input_path = sys.argv[2] if len(sys.argv) > 2 else PACKED_FILE
+        output_path = sys.argv[3] if len(sys.argv) > 3 else None
+        with PackedPuzzles(input_path) as puzzles:
+            records = list(puzzles)
+        text = json.dumps(records, indent=2, ensure_ascii=False)
+        if output_path is None:
+            print(text)
+        else:
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            print(f"✨ {len(records)} 件を書き出しました: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
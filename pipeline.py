@@ -0,0 +1,238 @@
+"""
+kifs/ を監視して、新しい棋譜を変換 → 候補局面の抽出 → 詰み探索 まで流し続ける。
+
+add_kif_files.py → convert_kif.py → tsume_maker.py を順に手で実行する代わりに、
+kifs/ に棋譜を置けば数秒後には puzzles.db に問題が入る。段どうしは大きさに上限のある
+キューでつなぐので、探索が追いつかなければ前の段が待つ（変換だけが先に進みすぎない）。
+
+    python pipeline.py          # Ctrl+C で止めるまで監視する
+    python pipeline.py --once   # 今ある新しい棋譜だけ処理して終了する
+
+kifs/ の変化はポーリングで調べる（標準ライブラリだけで動かすため inotify は使わない）。
+変換の記録は convert_kif と同じ manifest.json / output.sfen に残すので、
+あとから convert_kif.py や tsume_maker.py を実行しても同じ棋譜を2回処理しない。
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "sfen_maker_1"))
+
+import tsume_maker
+from candidate_extractor import extract_all
+from convert_kif import (
+    KIFS_FOLDER,
+    SFEN_OUTPUT_FOLDER,
+    append_output,
+    convert_worker,
+    find_changes,
+    load_manifest,
+    manifest_entry,
+    save_manifest,
+    write_output,
+)
+from daemon_client import daemon_available
+from kif_reader import is_kif_source
+from move_validator import QUARANTINE_FILE, quarantine, validate_games
+from position_cache import PositionCache, game_id, position_key
+from puzzle_db import PuzzleDB
+from telemetry import Telemetry
+
+# === ユーザー設定 ===
+POLL_INTERVAL_S = 2.0  # kifs/ を調べる間隔（秒）
+SETTLE_S = 1.0  # 更新からこれだけ経っていないファイルは書き込み中とみなして次に回す
+FILE_QUEUE_SIZE = 64  # 変換待ちの棋譜ファイル数の上限
+GAME_QUEUE_SIZE = 256  # 候補抽出待ちの対局数の上限
+EXTRACT_BATCH_SIZE = GAME_QUEUE_SIZE  # 1つの手順木にまとめて候補を取り出す対局数の上限
+SOLVE_BATCH_SIZE = 32  # 1回にまとめてエンジンに送る局面数の上限
+POSITION_QUEUE_SIZE = SOLVE_BATCH_SIZE * 4  # 探索待ちの局面数の上限
+
+DONE = None  # 上流の段が終わったことを下流に伝える
+
+
+async def watch_stage(file_queue, manifest, once=False):
+    """kifs/ の新しい・変更された棋譜を file_queue に入れる"""
+    queued = {}  # 変換待ちのファイル → ハッシュ（同じ内容を2回入れない）
+    while True:
+        kif_paths = sorted(
+            os.path.join(KIFS_FOLDER, f) for f in os.listdir(KIFS_FOLDER) if is_kif_source(f)
+        )
+        now = time.time()
+        for kif_path, st, digest in find_changes(kif_paths, manifest):
+            if queued.get(kif_path) == digest:
+                continue
+            if not once and now - st.st_mtime < SETTLE_S:
+                continue
+            queued[kif_path] = digest
+            await file_queue.put((kif_path, st, digest))
+        if once:
+            await file_queue.put(DONE)
+            return
+        await asyncio.sleep(POLL_INTERVAL_S)
+
+
+async def convert_stage(file_queue, game_queue, manifest, rebuild=False):
+    """棋譜を SFEN に変換して output.sfen に反映し、合法な対局を game_queue に入れる
+
+    rebuild なら最初の1ファイルで output.sfen を manifest から作り直す（manifest がなかったとき）。
+    """
+    while (item := await file_queue.get()) is not DONE:
+        kif_path, st, digest = item
+        _, sfens, errors = await asyncio.to_thread(convert_worker, kif_path)
+        for error in errors:
+            print(f"❌ {kif_path}: {error}")
+
+        # 変更されたファイルなら古い行を消すために作り直す
+        rebuild = rebuild or kif_path in manifest
+        manifest[kif_path] = manifest_entry(st, digest, sfens, errors)
+        if rebuild:
+            write_output(manifest)
+            rebuild = False
+        else:
+            append_output(sfens)
+        save_manifest(manifest)
+
+        valid, quarantined = validate_games(sfens)
+        if quarantined:
+            added = quarantine(quarantined)
+            print(f"🚧 {kif_path}: 不正な手のある {len(quarantined)} 局を除きました（{QUARANTINE_FILE} に新しく {added} 局）")
+        print(f"📥 {kif_path}: {len(valid)} 局")
+        for sfen in valid:
+            await game_queue.put(sfen)
+    await game_queue.put(DONE)
+
+
+async def extract_stage(game_queue, position_queue):
+    """対局から候補局面を取り出し、初めて見る局面を position_queue に入れる
+
+    溜まっている対局は EXTRACT_BATCH_SIZE 局までまとめて1つの手順木に入れる
+    （共通の序盤を1回だけ再現する）。合法性は convert_stage で確かめ済み。
+    """
+    seen_keys = set()
+    done = False
+    while not done:
+        game = await game_queue.get()
+        games = []
+        while game is not DONE:
+            games.append(game)
+            if len(games) >= EXTRACT_BATCH_SIZE or game_queue.empty():
+                break
+            game = game_queue.get_nowait()
+        done = game is DONE
+        if not games:
+            continue
+
+        sources = {}
+        candidates = await asyncio.to_thread(
+            extract_all, games, tsume_maker.CANDIDATE_PLIES, sources, validate=False
+        )
+        for sfen in candidates:
+            try:
+                key = position_key(sfen)
+            except ValueError:
+                continue
+            # 手順が違っても同じ局面なら1回だけ調べる
+            if key in seen_keys:
+                continue
+            seen_keys.add(key)
+            await position_queue.put((sfen, game_id(sources[sfen]), key))
+    await position_queue.put(DONE)
+
+
+async def solve_stage(position_queue, db, cache, telemetry, engines):
+    """局面を SOLVE_BATCH_SIZE 件までまとめて調べ、見つけた問題をすぐ DB に書き込む"""
+    done = False
+    while not done:
+        item = await position_queue.get()
+        batch = []
+        while item is not DONE:
+            batch.append(item)
+            if len(batch) >= SOLVE_BATCH_SIZE or position_queue.empty():
+                break
+            item = position_queue.get_nowait()
+        done = item is DONE
+        if not batch:
+            continue
+
+        inserted, inserted_derived = db.inserted, db.inserted_derived
+        reported = set()
+        accepted = []  # 新しく加えた問題（探索が終わってから派生問題を取り出す）
+
+        def save_result(idx, sfen, result, verbose=True):
+            reported.add(idx)
+            record = tsume_maker.make_record(sfen, result, verbose)
+            if record is None:
+                return
+            _, source_game, key = batch[idx]
+            if tsume_maker.store_puzzle(db, record, source_game, key):
+                accepted.append((record, source_game, key))
+
+        sfen_list = [sfen for sfen, _, _ in batch]
+        results = await tsume_maker.solve_positions_async(
+            sfen_list, on_result=save_result, cache=cache, telemetry=telemetry, engines=engines
+        )
+        # キャッシュから読んだ局面も入れておく（すでに入っている局面は store_puzzle で飛ばす）
+        for idx, (sfen, result) in enumerate(zip(sfen_list, results)):
+            if idx not in reported and result is not None:
+                save_result(idx, sfen, result, verbose=False)
+        # df-pn で確かめるので、ほかの段を止めないようスレッドで（DB への追加はこのスレッドで）
+        sub_puzzles = await asyncio.to_thread(tsume_maker.derive_all, accepted, cache)
+        for sub_record, source_game, parent_hash in sub_puzzles:
+            db.add(sub_record, source_game=source_game, parent_hash=parent_hash)
+        db.flush()
+        # 実際に新しく入った件数（すでにあった局面は数えない）
+        derived = db.inserted_derived - inserted_derived
+        saved = db.inserted - inserted - derived
+        print(f"✨ {len(batch)} 局面から {saved} 件を保存しました（派生: {derived}）")
+
+
+async def run_pipeline(once=False):
+    os.makedirs(KIFS_FOLDER, exist_ok=True)
+    os.makedirs(SFEN_OUTPUT_FOLDER, exist_ok=True)
+
+    file_queue = asyncio.Queue(FILE_QUEUE_SIZE)
+    game_queue = asyncio.Queue(GAME_QUEUE_SIZE)
+    position_queue = asyncio.Queue(POSITION_QUEUE_SIZE)
+
+    manifest = load_manifest()
+    # manifest がなければ、既存の output.sfen は信用せず作り直す
+    rebuild = manifest is None
+    manifest = manifest or {}
+    db = PuzzleDB()
+    cache = PositionCache()
+    telemetry = Telemetry() if tsume_maker.WRITE_METRICS else None
+    engines = None
+    try:
+        # デーモンがなければエンジンを起動しておき、バッチごとに使い回す
+        if not daemon_available():
+            pool_size = tsume_maker.ENGINE_POOL_SIZE
+            threads, hash_mb = tsume_maker.engine_resources(pool_size)
+            engines = await asyncio.gather(
+                *(tsume_maker.start_engine(f"engine{i}", threads, hash_mb) for i in range(pool_size))
+            )
+        print(f"👀 {KIFS_FOLDER} を監視しています（{POLL_INTERVAL_S} 秒ごと）")
+        await asyncio.gather(
+            watch_stage(file_queue, manifest, once),
+            convert_stage(file_queue, game_queue, manifest, rebuild),
+            extract_stage(game_queue, position_queue),
+            solve_stage(position_queue, db, cache, telemetry, engines),
+        )
+    finally:
+        if engines:
+            await asyncio.gather(*(engine.quit() for engine in engines))
+        db.close()
+        if telemetry is not None:
+            telemetry.close()
+
+
+def main():
+    once = "--once" in sys.argv[1:]
+    try:
+        asyncio.run(run_pipeline(once))
+    except KeyboardInterrupt:
+        print("\n🛑 ユーザーが Ctrl+C を押したため、終了します。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+解析済み局面のキャッシュ（チェックポイント）。
+
+局面ごとの判定（詰み手数・手順・余詰め・詰みなし・時間切れ）と
+使った探索時間を JSONL に追記しておき、再実行や中断後の再開では
+同じ局面をエンジンに送らない。時間切れの局面は、前回より長い
+持ち時間で探索するときだけやり直す。
+"""
+import hashlib
+import os
+
+from shogi_board import Board
+from tsume_store import append_record, iter_records
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+POSITION_CACHE = os.path.join(SCRIPT_DIR, "position_cache.jsonl")
+
+# 判定の種類
+STATUS_MATE = "mate"
+STATUS_YOZUME = "yozume"  # 余詰め
+STATUS_NOMATE = "nomate"
+STATUS_TIMEOUT = "timeout"
+
+
+def position_key(sfen):
+    """局面の正規化ハッシュ（手順・手数が違っても同じ局面なら同じ値）
+
+    盤面に再現できない局面は ValueError。
+    """
+    canonical = Board.from_position(sfen).key()
+    return hashlib.sha1(canonical.encode("utf-8")).hexdigest()
+
+
+def game_id(position):
+    """元の対局（`position startpos moves ...` の全手順）の短い識別子"""
+    return hashlib.sha1(position.encode("utf-8")).hexdigest()[:16]
+
+
+def search_status(lines, result):
+    """探索の出力と parse_mate_info の結果から判定の種類を決める"""
+    mate1, mate2, _ = result
+    if mate1 is not None:
+        if mate2 is not None and mate1 == mate2:
+            return STATUS_YOZUME
+        return STATUS_MATE
+    if "checkmate nomate" in lines:
+        return STATUS_NOMATE
+    return STATUS_TIMEOUT
+
+
+class PositionCache:
+    """局面ハッシュ → 判定 の永続キャッシュ"""
+
+    def __init__(self, path=POSITION_CACHE):
+        self.path = path
+        self.entries = {}
+        # 同じ局面が複数回書かれていたら後のものを採用
+        for entry in iter_records(path):
+            self.entries[entry["key"]] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, sfen):
+        return self.entries.get(position_key(sfen))
+
+    def needs_search(self, sfen, time_ms):
+        """この持ち時間で探索し直す必要があるか"""
+        entry = self.get(sfen)
+        if entry is None:
+            return True
+        if entry["status"] == STATUS_TIMEOUT:
+            return time_ms > entry["time_ms"]
+        return False
+
+    def put(self, sfen, result, status, time_ms, elapsed_ms, tier=None):
+        """判定を記録し、すぐにファイルへ追記する
+
+        tier はどの段階（df-pn / 持ち時間の段）で決着したかの記録。
+        """
+        mate1, mate2, steps_str = result
+        entry = {
+            "key": position_key(sfen),
+            "status": status,
+            "mate_length": mate1,
+            "mate2_length": mate2,
+            "steps": steps_str,
+            "unique": status == STATUS_MATE,
+            "time_ms": time_ms,
+            "elapsed_ms": elapsed_ms,
+            "tier": tier,
+        }
+        self.entries[entry["key"]] = entry
+        append_record(entry, self.path)
+        return entry
+
+    @staticmethod
+    def entry_result(entry):
+        """キャッシュの判定を parse_mate_info と同じ形に戻す"""
+        return entry["mate_length"], entry["mate2_length"], entry["steps"]
@@ -0,0 +1,255 @@
+"""
+詰将棋データの SQLite ストア（puzzles.db）。
+
+tsume_maker は見つけた問題をここに直接書き込む。局面ハッシュに一意インデックスが
+あるので同じ局面は1回しか入らず、詰み手数・元の対局・追加日時で索引から引ける。
+フロントエンド用の tsumeshogi.json（JSON配列）は export コマンドで作る:
+
+    python puzzle_db.py export          # puzzles.db → tsumeshogi.json
+    python puzzle_db.py import          # tsumeshogi.jsonl / .json → puzzles.db
+    python puzzle_db.py stats           # 詰み手数ごとの件数
+    python puzzle_db.py random [手数]   # ランダムに1問
+"""
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+
+from position_cache import position_key
+from shogi_board import compact_position
+from tsume_store import TSUME_JSON, TSUME_JSONL, iter_records, migrate_json
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PUZZLE_DB = os.path.join(SCRIPT_DIR, "puzzles.db")
+BATCH_SIZE = 100  # これだけ溜まったらまとめて INSERT する
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS puzzles (
+    id INTEGER PRIMARY KEY,
+    position_hash TEXT NOT NULL,
+    board TEXT NOT NULL,
+    sfen TEXT NOT NULL,
+    steps TEXT NOT NULL,
+    mate_length INTEGER NOT NULL,
+    source_game TEXT,
+    added_at TEXT NOT NULL,
+    parent_hash TEXT
+);
+"""
+INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_puzzles_position_hash ON puzzles(position_hash);
+CREATE INDEX IF NOT EXISTS idx_puzzles_mate_length ON puzzles(mate_length);
+CREATE INDEX IF NOT EXISTS idx_puzzles_source_game ON puzzles(source_game);
+CREATE INDEX IF NOT EXISTS idx_puzzles_added_at ON puzzles(added_at);
+CREATE INDEX IF NOT EXISTS idx_puzzles_parent_hash ON puzzles(parent_hash);
+"""
+
+INSERT_SQL = (
+    "INSERT OR IGNORE INTO puzzles"
+    " (position_hash, board, sfen, steps, mate_length, source_game, added_at, parent_hash)"
+    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+)
+
+# tsumeshogi.json の1件の形
+RECORD_FIELDS = ("board", "sfen", "steps", "mate_length")
+
+
+class PuzzleDB:
+    """詰将棋の SQLite ストア。add() した問題は BATCH_SIZE 件ごとに書き込む
+
+    inserted / inserted_derived は、この接続で実際に新しく入った問題数（うち派生問題）。
+    """
+
+    def __init__(self, path=PUZZLE_DB, batch_size=BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self.pending = []
+        self.pending_hashes = set()
+        self.inserted = 0
+        self.inserted_derived = 0
+        self.conn = sqlite3.connect(path)
+        self.conn.row_factory = sqlite3.Row
+        # WAL なら書き込み中もフロントエンドから読める
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self.conn.execute("PRAGMA table_info(puzzles)")}
+        if "parent_hash" not in columns:
+            # 派生問題の親を記録する列がない古い DB
+            self.conn.execute("ALTER TABLE puzzles ADD COLUMN parent_hash TEXT")
+        self.conn.executescript(INDEXES)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        self.flush()
+        return self.conn.execute("SELECT COUNT(*) FROM puzzles").fetchone()[0]
+
+    def __contains__(self, position_hash):
+        """この局面がすでに入っているか（書き込み待ちも含む）"""
+        if position_hash in self.pending_hashes:
+            return True
+        row = self.conn.execute(
+            "SELECT 1 FROM puzzles WHERE position_hash = ?", (position_hash,)
+        ).fetchone()
+        return row is not None
+
+    def add(self, record, source_game=None, position_hash=None, parent_hash=None):
+        """1件を書き込み待ちに加える（同じ局面がすでにあれば無視される）
+
+        parent_hash は、手順の途中から取り出した問題の元の問題の局面ハッシュ。
+        """
+        if position_hash is None:
+            position_hash = position_key(record["board"])
+        self.pending.append((
+            position_hash,
+            record["board"],
+            record.get("sfen") or compact_position(record["board"]),
+            record["steps"],
+            record["mate_length"],
+            source_game,
+            time.strftime("%Y-%m-%d %H:%M:%S"),
+            parent_hash,
+        ))
+        self.pending_hashes.add(position_hash)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """書き込み待ちの問題を1トランザクションで INSERT する。新しく入った件数を返す"""
+        if not self.pending:
+            return 0
+        with self.conn:
+            # 元の問題を先に入れ、派生問題の件数は別に数える
+            before = self.conn.total_changes
+            self.conn.executemany(INSERT_SQL, [row for row in self.pending if row[-1] is None])
+            derived_before = self.conn.total_changes
+            self.conn.executemany(INSERT_SQL, [row for row in self.pending if row[-1] is not None])
+            inserted = self.conn.total_changes - before
+            derived = self.conn.total_changes - derived_before
+        self.pending = []
+        self.pending_hashes = set()
+        self.inserted += inserted
+        self.inserted_derived += derived
+        return inserted
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    @staticmethod
+    def to_record(row):
+        """行を tsumeshogi.json の1件の形にする"""
+        return {field: row[field] for field in RECORD_FIELDS}
+
+    def get(self, position_hash):
+        row = self.conn.execute(
+            "SELECT * FROM puzzles WHERE position_hash = ?", (position_hash,)
+        ).fetchone()
+        return None if row is None else self.to_record(row)
+
+    def children(self, position_hash):
+        """この問題の手順の途中から取り出した問題"""
+        rows = self.conn.execute(
+            "SELECT * FROM puzzles WHERE parent_hash = ? ORDER BY mate_length DESC", (position_hash,)
+        )
+        return [self.to_record(row) for row in rows]
+
+    def by_length(self, mate_length, limit=100, offset=0):
+        """mate_length 手詰めの問題を追加順に返す"""
+        rows = self.conn.execute(
+            "SELECT * FROM puzzles WHERE mate_length = ? ORDER BY id LIMIT ? OFFSET ?",
+            (mate_length, limit, offset),
+        )
+        return [self.to_record(row) for row in rows]
+
+    def random_puzzle(self, mate_length=None):
+        """ランダムに1問返す（全件を読まずに索引で引く）。なければ None"""
+        self.flush()
+        where, params = "", ()
+        if mate_length is not None:
+            where, params = "WHERE mate_length = ?", (mate_length,)
+        low, high = self.conn.execute(
+            f"SELECT MIN(id), MAX(id) FROM puzzles {where}", params
+        ).fetchone()
+        if low is None:
+            return None
+
+        # 適当な id 以上で最初の1件。id に抜けがあっても索引で1回引くだけ
+        pivot = random.randint(low, high)
+        and_where = "AND" if where else "WHERE"
+        row = self.conn.execute(
+            f"SELECT * FROM puzzles {where} {and_where} id >= ? ORDER BY id LIMIT 1",
+            params + (pivot,),
+        ).fetchone()
+        return self.to_record(row)
+
+    def length_counts(self):
+        """{詰み手数: 件数}"""
+        rows = self.conn.execute(
+            "SELECT mate_length, COUNT(*) FROM puzzles GROUP BY mate_length ORDER BY mate_length"
+        )
+        return dict(rows.fetchall())
+
+    def iter_records(self):
+        self.flush()
+        for row in self.conn.execute("SELECT * FROM puzzles ORDER BY id"):
+            yield self.to_record(row)
+
+
+def import_jsonl(db, jsonl_path=TSUME_JSONL, json_path=TSUME_JSON):
+    """既存の tsumeshogi.jsonl（なければ tsumeshogi.json）の問題を取り込む"""
+    migrate_json(json_path, jsonl_path)
+    added = 0
+    for record in iter_records(jsonl_path):
+        try:
+            db.add(record)
+        except (KeyError, ValueError) as e:
+            print(f"⚠️ 取り込めない問題をスキップ: {e}")
+            continue
+        added += 1
+    db.flush()
+    print(f"📦 {jsonl_path} から {added} 件を {db.path} に取り込みました")
+    return added
+
+
+def export_json(db, json_path=TSUME_JSON):
+    """tsumeshogi.json と同じ形の JSON 配列に書き出す（一時ファイル経由で置き換え）"""
+    records = list(db.iter_records())
+    tmp_path = json_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(records, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, json_path)
+    print(f"✨ JSON書き出し完了: {json_path} ({len(records)} 件)")
+    return len(records)
+
+
+def main():
+    commands = ("export", "import", "stats", "random")
+    if len(sys.argv) < 2 or sys.argv[1] not in commands:
+        print(f"使い方: python puzzle_db.py [{'|'.join(commands)}]")
+        return
+
+    with PuzzleDB() as db:
+        if sys.argv[1] == "export":
+            export_json(db)
+        elif sys.argv[1] == "import":
+            import_jsonl(db)
+        elif sys.argv[1] == "stats":
+            for mate_length, count in db.length_counts().items():
+                print(f"{mate_length}手詰め: {count} 件")
+            print(f"合計: {len(db)} 件")
+        else:
+            mate_length = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            puzzle = db.random_puzzle(mate_length)
+            print(json.dumps(puzzle, ensure_ascii=False, indent=2) if puzzle else "⚠️ 問題がありません")
+
+
+if __name__ == "__main__":
+    main()
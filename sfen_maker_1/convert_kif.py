@@ -1,109 +1,207 @@
+import hashlib
+import json
 import os
-import re
+import sys
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+# リポジトリ直下の共通モジュールを読み込めるようにする
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kif_parser import NUMBERED_RE, KifParseError, iter_usi_moves, kif_to_position, moves_to_position
+from kif_reader import is_kif_source, iter_games
 
 # フォルダのパス
 KIFS_FOLDER = "kifs"
 SFEN_OUTPUT_FOLDER = "sfen_maker_1/output_sfens"
 SFEN_OUTPUT_FILE = os.path.join(SFEN_OUTPUT_FOLDER, "output.sfen")
+# 変換済みファイルの記録（パス → サイズ・更新時刻・ハッシュ・SFEN）
+MANIFEST_FILE = os.path.join(SFEN_OUTPUT_FOLDER, "manifest.json")
 
-# USI 変換用辞書
-USI_PIECES = {
-    "歩": "P", "香": "L", "桂": "N", "銀": "S",
-    "金": "G", "角": "B", "飛": "R", "王": "K"
-}
+# 並列変換の設定
+WORKERS = os.cpu_count() or 1  # 変換に使うプロセス数
+CHUNK_SIZE = 64  # 1回にワーカーへ渡すファイル数
+PARALLEL_MIN_FILES = 256  # これより少なければ1プロセスで変換する
 
-trans_file1 = {'一': "a", '二': "b", '三': "c", '四': "d", '五': "e", '六': "f", '七': "g", '八': "h", '九': "i"}
-trans_file2 = {'1': "a", '2': "b", '3': "c", '4': "d", '5': "e", '6': "f", '7': "g", '8': "h", '9': "i"}
-trans_file3 = {'１': "1", '２': "2", '３': "3", '４': "4", '５': "5", '６': "6", '７': "7", '８': "8", '９': "9"}
 
 # KIF ファイルを正規化（不要な情報削除）
 def clean_kifu(kif_path):
-    """ KIFファイルを読み込み、指し手のみを抽出 """
-    cleaned_moves = []
-    
+    """ KIFファイルを読み込み、手数で始まる行（指し手・終局）だけを抽出 """
     with open(kif_path, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    for line in lines:
-        line = line.strip()
-
-        if not line or line.startswith("*"):  # 空行やコメント行をスキップ
-            continue
-
-        # 🔍 `(\d+:\d+/\d+:\d+)` の時間情報を削除
-        line = re.sub(r'\(\d+:\d+/\d+:\d+\)', '', line)
-
-        # 🔍 指し手の行だけ取得
-        if re.match(r'^\d+\s+[１-９][一二三四五六七八九][歩香桂銀金角飛玉と馬龍]*(成桂|成銀|成香)?+', line):
-            cleaned_moves.append(line)
-
-    return cleaned_moves
+        return [line.strip() for line in f if NUMBERED_RE.match(line)]
 
 
 # SFEN 形式に変換
 def process_sfen(cleaned_moves):
     """ 指し手を SFEN 形式に変換 """
-    result = "position startpos moves "
-    
-    for line in cleaned_moves:
-        space_index = line.index(" ")
-        moved_file = line[space_index + 1]  # 移動後の筋
-        moved_rank = line[space_index + 2]
-
-        if line[space_index + 4] == "(":
-            before_file = line[space_index + 5]  # 移動前の筋
-            before_rank = line[space_index + 6]
-        else:
-            before_file = line[space_index + 6]
-            before_rank = line[space_index + 7]
-
-        result_moved_file = trans_file3.get(moved_file)
-        result_moved = trans_file1.get(moved_rank)
-        result_before = trans_file2.get(before_rank)
-
-        if "打" in line:
-            piece = USI_PIECES.get(line[space_index + 3])
-            made_line = str(piece) + "*" + str(result_moved_file) + str(result_moved) + " "
-        else:
-            made_line = str(before_file) + str(result_before) + str(result_moved_file) + str(result_moved)
-
-            if "成(" in line:
-                made_line += "+ "
-            else:
-                made_line += " "
-                
-        result += made_line
-    
-    return result
-
-
-# KIF フォルダ内の全ファイルを処理する
-def process_all_kif():
-    """ KIF フォルダ内の全棋譜を SFEN に変換し、output.sfen に追加 """
-    os.makedirs(SFEN_OUTPUT_FOLDER, exist_ok=True)
-
-    kif_files = [f for f in os.listdir(KIFS_FOLDER) if f.endswith(".kif")]
-
-    if not kif_files:
-        print("⚠️ KIFフォルダに処理するファイルがありません。")
-        return
+    return moves_to_position(iter_usi_moves(cleaned_moves))
+
+
+def convert_kif_file(kif_path):
+    """ 棋譜ファイル・アーカイブを1局ずつ読んで変換し、(SFENのリスト, エラーのリスト) を返す """
+    sfens = []
+    errors = []
+    for name, lines in iter_games(kif_path):
+        try:
+            sfen = kif_to_position(lines)
+        except KifParseError as e:
+            errors.append(f"{name}: {e}")
+            continue
+        if sfen:
+            sfens.append(sfen)
+    return sfens, errors
+
+
+def convert_worker(kif_path):
+    """ ワーカー用: (パス, SFENのリスト, エラーのリスト) を返す """
+    try:
+        sfens, errors = convert_kif_file(kif_path)
+        return kif_path, sfens, errors
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        return kif_path, [], [str(e)]
+
+
+def convert_files(kif_paths, workers=WORKERS):
+    """ 複数の KIF を変換し、入力順に (パス, SFENのリスト, エラーのリスト) を返す """
+    if workers <= 1 or len(kif_paths) < PARALLEL_MIN_FILES:
+        return map(convert_worker, kif_paths)
+
+    chunksize = max(1, min(CHUNK_SIZE, len(kif_paths) // (workers * 4)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # map は入力順に結果を返すので、出力順はファイル名順のまま
+        return list(executor.map(convert_worker, kif_paths, chunksize=chunksize))
+
+
+def file_hash(path):
+    """ ファイル内容の SHA-1 """
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def load_manifest():
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+        try:
+            manifest = json.load(f)
+        except json.JSONDecodeError:
+            print(f"⚠️ {MANIFEST_FILE} が壊れています。全ファイルを変換し直します。")
+            return None
+    if any("sfens" not in entry for entry in manifest.values()):
+        return None  # 古い形式
+    return manifest
+
+
+def save_manifest(manifest):
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+
+def manifest_entry(st, digest, sfens, errors):
+    """ manifest の1ファイル分 """
+    return {
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "hash": digest,
+        "sfens": sfens,
+        "errors": errors,
+    }
+
+
+def append_output(sfens):
+    """ output.sfen の末尾に追記する（ファイル名順には並べ直さない） """
+    with open(SFEN_OUTPUT_FILE, "a", encoding="utf-8") as f:
+        for sfen in sfens:
+            f.write(sfen + "\n")
+
+
+def write_output(manifest):
+    """ manifest の内容で output.sfen を作り直す（ファイル名順） """
+    tmp_path = SFEN_OUTPUT_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for kif_path in sorted(manifest):
+            for sfen in manifest[kif_path]["sfens"]:
+                f.write(sfen + "\n")
+    os.replace(tmp_path, SFEN_OUTPUT_FILE)
+
+
+def find_changes(kif_paths, manifest):
+    """ 新規・変更されたファイルを返す（サイズと更新時刻が同じならハッシュも見ない） """
+    changed = []
+    for kif_path in kif_paths:
+        st = os.stat(kif_path)
+        entry = manifest.get(kif_path)
+        if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            continue
 
-    with open(SFEN_OUTPUT_FILE, "a", encoding="utf-8") as f:  # 追記モードで開く
-        for kif_file in kif_files:
-            kif_path = os.path.join(KIFS_FOLDER, kif_file)
-            print(f"🔍 処理中: {kif_path}")
+        digest = file_hash(kif_path)
+        if entry and entry["hash"] == digest:
+            # 中身は同じ（touch されただけ）
+            entry["mtime_ns"] = st.st_mtime_ns
+            continue
+        changed.append((kif_path, st, digest))
+    return changed
 
-            # KIF をクリーニング
-            cleaned_moves = clean_kifu(kif_path)
 
-            # SFEN に変換
-            if cleaned_moves:
-                sfen = process_sfen(cleaned_moves)
-                f.write(sfen + "\n")  # `output.sfen` に1行ずつ追加
+# KIF フォルダ内の全ファイルを処理する
+def process_all_kif(workers=WORKERS):
+    """ KIF フォルダ内の新規・変更された棋譜だけを SFEN に変換し、output.sfen に反映
 
-                print(f"✅ 追加完了: {SFEN_OUTPUT_FILE}")
+    output.sfen がファイル名順になるのは作り直したときだけ。新しいファイルしかない実行では
+    その分を末尾に追記するので、行の順は変換した順になる（ファイル名順が必要なら manifest.json を消す）。
+    """
+    os.makedirs(SFEN_OUTPUT_FOLDER, exist_ok=True)
 
-    print(f"✨ すべての KIF を SFEN に変換し、output.sfen に追加しました！")
+    kif_files = sorted(f for f in os.listdir(KIFS_FOLDER) if is_kif_source(f))
+    kif_paths = [os.path.join(KIFS_FOLDER, kif_file) for kif_file in kif_files]
+
+    manifest = load_manifest()
+    # manifest がなければ、既存の output.sfen は信用せず作り直す
+    rebuild = manifest is None
+    manifest = manifest or {}
+
+    existing = set(kif_paths)
+    deleted = [kif_path for kif_path in manifest if kif_path not in existing]
+    for kif_path in deleted:
+        del manifest[kif_path]
+
+    changed = find_changes(kif_paths, manifest)
+    if any(kif_path in manifest for kif_path, _, _ in changed):
+        rebuild = True  # 変更されたファイルの古い行を消す
+    if deleted:
+        rebuild = True
+
+    print(f"🔍 {len(kif_paths)} ファイル中 {len(changed)} ファイルを変換中（削除: {len(deleted)}、プロセス数: {workers}）")
+
+    failed = []
+    added = []
+    stats = {kif_path: (st, digest) for kif_path, st, digest in changed}
+    for kif_path, sfens, errors in convert_files(list(stats), workers):
+        st, digest = stats[kif_path]
+        manifest[kif_path] = manifest_entry(st, digest, sfens, errors)
+        failed.extend((kif_path, error) for error in errors)
+        added.extend(sfens)
+
+    if rebuild:
+        write_output(manifest)
+        print(f"♻️ {SFEN_OUTPUT_FILE} を作り直しました")
+    elif added:
+        append_output(added)  # 新しいファイルの分だけ追記
+    save_manifest(manifest)
+
+    print(f"✅ {len(added)} 局を {SFEN_OUTPUT_FILE} に追加しました")
+    if failed:
+        print(f"❌ 変換できなかったファイル: {len(failed)}")
+        for kif_path, error in failed:
+            print(f"   {kif_path}: {error}")
+
+    print(f"✨ KIF の変換が完了しました！")
 
 
 # メイン処理
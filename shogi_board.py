@@ -0,0 +1,585 @@
+"""
+軽量な将棋盤モデル。
+
+USI の指し手（7g7f, 8h2b+, P*5e）を盤面に適用し、
+`position sfen <盤面> <手番> <持ち駒> <手数>` の短い局面表現を作る。
+手順が違っても同じ局面なら同じ key() になるので、重複除去にも使える。
+"""
+
+# 手番
+BLACK = 0  # 先手
+WHITE = 1  # 後手
+
+# 駒の種類（YaneuraOu と同じ並び）
+EMPTY = 0
+PAWN, LANCE, KNIGHT, SILVER, BISHOP, ROOK, GOLD, KING = range(1, 9)
+PRO_PAWN, PRO_LANCE, PRO_KNIGHT, PRO_SILVER, HORSE, DRAGON = range(9, 15)
+PROMOTE = 8  # 成り駒 = 元の駒 + PROMOTE
+WHITE_FLAG = 16  # 後手の駒 = 駒の種類 + WHITE_FLAG
+
+# 持ち駒にできる駒
+HAND_PIECES = (PAWN, LANCE, KNIGHT, SILVER, BISHOP, ROOK, GOLD)
+# SFEN の持ち駒を書く順番
+SFEN_HAND_ORDER = (ROOK, BISHOP, GOLD, SILVER, KNIGHT, LANCE, PAWN)
+
+PIECE_LETTERS = {
+    PAWN: "P", LANCE: "L", KNIGHT: "N", SILVER: "S",
+    BISHOP: "B", ROOK: "R", GOLD: "G", KING: "K",
+}
+LETTER_PIECES = {v: k for k, v in PIECE_LETTERS.items()}
+
+RANK_LETTERS = "abcdefghi"
+
+STARTPOS_SFEN = "lnsgkgsnl/1r5b1/ppppppppp/9/9/9/PPPPPPPPP/1B5R1/LNSGKGSNL b - 1"
+
+
+def square(file, rank):
+    """筋(1-9)・段(1-9) → マス番号(0-80)"""
+    return (file - 1) * 9 + (rank - 1)
+
+
+def parse_square(text):
+    """USI のマス表記 "7g" → マス番号"""
+    file = ord(text[0]) - ord("0")
+    rank = ord(text[1]) - ord("a") + 1
+    if not (1 <= file <= 9 and 1 <= rank <= 9):
+        raise ValueError(f"不正なマス: {text}")
+    return square(file, rank)
+
+
+def square_name(sq):
+    """マス番号 → USI のマス表記"""
+    return f"{sq // 9 + 1}{RANK_LETTERS[sq % 9]}"
+
+
+def piece_type(piece):
+    return piece & 15
+
+
+def piece_color(piece):
+    return WHITE if piece & WHITE_FLAG else BLACK
+
+
+def make_piece(color, ptype):
+    return ptype | (WHITE_FLAG if color == WHITE else 0)
+
+
+def unpromote(ptype):
+    """成り駒を元の駒に戻す（王・金・生駒はそのまま）"""
+    return ptype - PROMOTE if ptype > KING else ptype
+
+
+# --- 駒の利き（先手から見た (筋の増分, 段の増分)。段は負が前） ---
+_GOLD_STEPS = ((0, -1), (1, -1), (-1, -1), (1, 0), (-1, 0), (0, 1))
+_DIAGONALS = ((1, -1), (-1, -1), (1, 1), (-1, 1))
+_ORTHOGONALS = ((0, -1), (1, 0), (-1, 0), (0, 1))
+
+STEP_DIRS = {
+    PAWN: ((0, -1),),
+    LANCE: (),
+    KNIGHT: ((1, -2), (-1, -2)),
+    SILVER: ((0, -1), (1, -1), (-1, -1), (1, 1), (-1, 1)),
+    BISHOP: (),
+    ROOK: (),
+    GOLD: _GOLD_STEPS,
+    KING: _DIAGONALS + _ORTHOGONALS,
+    PRO_PAWN: _GOLD_STEPS,
+    PRO_LANCE: _GOLD_STEPS,
+    PRO_KNIGHT: _GOLD_STEPS,
+    PRO_SILVER: _GOLD_STEPS,
+    HORSE: _ORTHOGONALS,
+    DRAGON: _DIAGONALS,
+}
+SLIDE_DIRS = {
+    LANCE: ((0, -1),),
+    BISHOP: _DIAGONALS,
+    ROOK: _ORTHOGONALS,
+    HORSE: _DIAGONALS,
+    DRAGON: _ORTHOGONALS,
+}
+
+
+def _on_board(file, rank):
+    return 1 <= file <= 9 and 1 <= rank <= 9
+
+
+def _ray(sq, df, dr):
+    """sq から (df, dr) 方向に盤端まで進んだマスの並び"""
+    file, rank = sq // 9 + 1 + df, sq % 9 + 1 + dr
+    ray = []
+    while _on_board(file, rank):
+        ray.append(square(file, rank))
+        file += df
+        rank += dr
+    return tuple(ray)
+
+
+def _build_tables():
+    """利きの計算に使う表を作る（マスごとの方向別の並びなど）"""
+    step_targets = [[()] * 81 for _ in range(32)]
+    slide_targets = [[()] * 81 for _ in range(32)]
+    attack_rays = ([None] * 81, [None] * 81)
+    knight_from = ([()] * 81, [()] * 81)
+
+    for color in (BLACK, WHITE):
+        flip = -1 if color == WHITE else 1
+        for ptype in range(PAWN, DRAGON + 1):
+            piece = make_piece(color, ptype)
+            for sq in range(81):
+                step_targets[piece][sq] = tuple(
+                    ray[0]
+                    for ray in (_ray(sq, df, dr * flip) for df, dr in STEP_DIRS[ptype])
+                    if ray
+                )
+                slide_targets[piece][sq] = tuple(
+                    ray
+                    for ray in (_ray(sq, df, dr * flip) for df, dr in SLIDE_DIRS.get(ptype, ()))
+                    if ray
+                )
+
+        for sq in range(81):
+            rays = []
+            for df, dr in _DIAGONALS + _ORTHOGONALS:
+                # sq から (df, dr) 方向にいる駒は、逆方向に利かせて sq に届く
+                direction = (-df, -dr * flip)
+                near = frozenset(
+                    make_piece(color, ptype)
+                    for ptype in range(PAWN, DRAGON + 1)
+                    if direction in STEP_DIRS[ptype] or direction in SLIDE_DIRS.get(ptype, ())
+                )
+                far = frozenset(
+                    make_piece(color, ptype)
+                    for ptype in SLIDE_DIRS
+                    if direction in SLIDE_DIRS[ptype]
+                )
+                ray = _ray(sq, df, dr)
+                if ray:
+                    rays.append((ray, near, far))
+            attack_rays[color][sq] = tuple(rays)
+
+            file, rank = sq // 9 + 1, sq % 9 + 1
+            knight_from[color][sq] = tuple(
+                square(file - df, rank - dr * flip)
+                for df, dr in STEP_DIRS[KNIGHT]
+                if _on_board(file - df, rank - dr * flip)
+            )
+
+    return step_targets, slide_targets, attack_rays, knight_from
+
+
+_STEP_TARGETS, _SLIDE_TARGETS, _ATTACK_RAYS, _KNIGHT_FROM = _build_tables()
+
+
+def _relative_rank(color, rank):
+    """手番側から見た段（1 = 敵陣の一番奥）"""
+    return rank if color == BLACK else 10 - rank
+
+
+def move_to_usi(move):
+    """内部の指し手 (from_sq, to_sq, promote, drop) → USI 表記"""
+    from_sq, to_sq, promote, drop = move
+    if drop:
+        return f"{PIECE_LETTERS[drop]}*{square_name(to_sq)}"
+    return square_name(from_sq) + square_name(to_sq) + ("+" if promote else "")
+
+
+class Board:
+    """盤面 + 持ち駒 + 手番 + 手数"""
+
+    __slots__ = ("squares", "hands", "side", "ply")
+
+    def __init__(self):
+        self.squares = bytearray(81)
+        self.hands = (bytearray(8), bytearray(8))  # 添字 = 駒の種類
+        self.side = BLACK
+        self.ply = 1
+
+    # --- 生成 ---
+
+    @classmethod
+    def from_sfen(cls, sfen):
+        """`<盤面> <手番> <持ち駒> [手数]` から盤を作る"""
+        fields = sfen.split()
+        if len(fields) < 3:
+            raise ValueError(f"不正なSFEN: {sfen}")
+
+        board = cls()
+        rows = fields[0].split("/")
+        if len(rows) != 9:
+            raise ValueError(f"不正なSFEN: {sfen}")
+        for rank, row in enumerate(rows, start=1):
+            file = 9
+            promoted = False
+            for ch in row:
+                if ch == "+":
+                    promoted = True
+                    continue
+                if ch.isdigit():
+                    file -= int(ch)
+                    continue
+                ptype = LETTER_PIECES.get(ch.upper())
+                if ptype is None or file < 1:
+                    raise ValueError(f"不正なSFEN: {sfen}")
+                if promoted:
+                    ptype += PROMOTE
+                    promoted = False
+                color = BLACK if ch.isupper() else WHITE
+                board.squares[square(file, rank)] = make_piece(color, ptype)
+                file -= 1
+            if file != 0:
+                raise ValueError(f"不正なSFEN: {sfen}")
+
+        board.side = BLACK if fields[1] == "b" else WHITE
+
+        if fields[2] != "-":
+            count = 0
+            for ch in fields[2]:
+                if ch.isdigit():
+                    count = count * 10 + int(ch)
+                    continue
+                ptype = LETTER_PIECES.get(ch.upper())
+                if ptype is None or ptype == KING:
+                    raise ValueError(f"不正な持ち駒: {fields[2]}")
+                color = BLACK if ch.isupper() else WHITE
+                board.hands[color][ptype] += count or 1
+                count = 0
+
+        if len(fields) >= 4:
+            board.ply = int(fields[3])
+        return board
+
+    @classmethod
+    def startpos(cls):
+        return cls.from_sfen(STARTPOS_SFEN)
+
+    @classmethod
+    def from_position(cls, command):
+        """`position startpos moves ...` / `position sfen ... moves ...` から盤を作る"""
+        tokens = command.split()
+        if tokens and tokens[0] == "position":
+            tokens = tokens[1:]
+        if not tokens:
+            raise ValueError(f"不正な局面: {command}")
+
+        if "moves" in tokens:
+            idx = tokens.index("moves")
+            head, moves = tokens[:idx], tokens[idx + 1:]
+        else:
+            head, moves = tokens, []
+
+        if head[0] == "startpos":
+            board = cls.startpos()
+        elif head[0] == "sfen":
+            board = cls.from_sfen(" ".join(head[1:]))
+        else:
+            raise ValueError(f"不正な局面: {command}")
+
+        for move in moves:
+            board.push_usi(move)
+        return board
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.squares = bytearray(self.squares)
+        board.hands = (bytearray(self.hands[0]), bytearray(self.hands[1]))
+        board.side = self.side
+        board.ply = self.ply
+        return board
+
+    # --- 指し手 ---
+
+    def push_usi(self, move):
+        """USI の指し手を1手進める。明らかに不正な手は ValueError"""
+        color = self.side
+
+        if len(move) == 4 and move[1] == "*":
+            ptype = LETTER_PIECES.get(move[0])
+            if ptype is None or ptype == KING:
+                raise ValueError(f"不正な打ち駒: {move}")
+            to_sq = parse_square(move[2:4])
+            if self.squares[to_sq]:
+                raise ValueError(f"駒のあるマスに打っています: {move}")
+            if not self.hands[color][ptype]:
+                raise ValueError(f"持ち駒がありません: {move}")
+            self.hands[color][ptype] -= 1
+            self.squares[to_sq] = make_piece(color, ptype)
+        else:
+            if len(move) not in (4, 5) or (len(move) == 5 and move[4] != "+"):
+                raise ValueError(f"不正な指し手: {move}")
+            from_sq = parse_square(move[0:2])
+            to_sq = parse_square(move[2:4])
+            piece = self.squares[from_sq]
+            if not piece or piece_color(piece) != color:
+                raise ValueError(f"移動元に手番の駒がありません: {move}")
+            captured = self.squares[to_sq]
+            if captured:
+                if piece_color(captured) == color:
+                    raise ValueError(f"自分の駒を取っています: {move}")
+                ptype = unpromote(piece_type(captured))
+                if ptype == KING:
+                    raise ValueError(f"玉を取っています: {move}")
+                self.hands[color][ptype] += 1
+            if len(move) == 5:
+                ptype = piece_type(piece)
+                if ptype >= GOLD:
+                    raise ValueError(f"成れない駒です: {move}")
+                piece += PROMOTE
+            self.squares[from_sq] = EMPTY
+            self.squares[to_sq] = piece
+
+        self.side ^= 1
+        self.ply += 1
+
+    def usi_to_move(self, move):
+        """USI 表記 → 内部の指し手 (from_sq, to_sq, promote, drop)"""
+        if len(move) == 4 and move[1] == "*":
+            return (None, parse_square(move[2:4]), False, LETTER_PIECES[move[0]])
+        return (parse_square(move[0:2]), parse_square(move[2:4]), move.endswith("+"), 0)
+
+    def do_move(self, move):
+        """合法性を確かめずに指す。取った駒を返す（undo_move 用）"""
+        from_sq, to_sq, promote, drop = move
+        color = self.side
+        if drop:
+            self.hands[color][drop] -= 1
+            self.squares[to_sq] = make_piece(color, drop)
+            captured = EMPTY
+        else:
+            piece = self.squares[from_sq]
+            captured = self.squares[to_sq]
+            if captured:
+                self.hands[color][unpromote(piece_type(captured))] += 1
+            self.squares[from_sq] = EMPTY
+            self.squares[to_sq] = piece + PROMOTE if promote else piece
+        self.side ^= 1
+        self.ply += 1
+        return captured
+
+    def undo_move(self, move, captured):
+        """do_move を取り消す"""
+        from_sq, to_sq, promote, drop = move
+        self.side ^= 1
+        self.ply -= 1
+        color = self.side
+        if drop:
+            self.squares[to_sq] = EMPTY
+            self.hands[color][drop] += 1
+        else:
+            piece = self.squares[to_sq]
+            self.squares[from_sq] = piece - PROMOTE if promote else piece
+            self.squares[to_sq] = captured
+            if captured:
+                self.hands[color][unpromote(piece_type(captured))] -= 1
+
+    # --- 利き ---
+
+    def king_square(self, color):
+        king = make_piece(color, KING)
+        idx = self.squares.find(king)
+        return idx if idx >= 0 else None
+
+    def is_attacked(self, sq, by_color):
+        """by_color の駒が sq に利いているか"""
+        squares = self.squares
+
+        for ray, near, far in _ATTACK_RAYS[by_color][sq]:
+            for distance, ray_sq in enumerate(ray):
+                piece = squares[ray_sq]
+                if piece:
+                    if piece in far or (distance == 0 and piece in near):
+                        return True
+                    break
+
+        knight = make_piece(by_color, KNIGHT)
+        for from_sq in _KNIGHT_FROM[by_color][sq]:
+            if squares[from_sq] == knight:
+                return True
+        return False
+
+    def in_check(self, color=None):
+        """color（省略時は手番側）の玉に王手がかかっているか"""
+        if color is None:
+            color = self.side
+        king_sq = self.king_square(color)
+        return king_sq is not None and self.is_attacked(king_sq, color ^ 1)
+
+    def attack_targets(self, sq):
+        """sq の駒が利いているマスを列挙する"""
+        piece = self.squares[sq]
+        yield from _STEP_TARGETS[piece][sq]
+        for ray in _SLIDE_TARGETS[piece][sq]:
+            for to_sq in ray:
+                yield to_sq
+                if self.squares[to_sq]:
+                    break
+
+    # --- 指し手生成 ---
+
+    def pseudo_moves(self):
+        """自玉の安全を確かめない指し手を列挙する"""
+        color = self.side
+        squares = self.squares
+
+        for from_sq in range(81):
+            piece = squares[from_sq]
+            if not piece or piece_color(piece) != color:
+                continue
+            ptype = piece_type(piece)
+            from_rank = _relative_rank(color, from_sq % 9 + 1)
+            for to_sq in self.attack_targets(from_sq):
+                target = squares[to_sq]
+                if target and piece_color(target) == color:
+                    continue
+                to_rank = _relative_rank(color, to_sq % 9 + 1)
+                if ptype < GOLD and (from_rank <= 3 or to_rank <= 3):
+                    yield (from_sq, to_sq, True, 0)
+                    # 行き所のない駒になる不成は生成しない
+                    if ptype in (PAWN, LANCE) and to_rank == 1:
+                        continue
+                    if ptype == KNIGHT and to_rank <= 2:
+                        continue
+                yield (from_sq, to_sq, False, 0)
+
+        hand = self.hands[color]
+        pawn_files = None
+        for ptype in HAND_PIECES:
+            if not hand[ptype]:
+                continue
+            if ptype == PAWN:
+                pawn = make_piece(color, PAWN)
+                pawn_files = {
+                    sq // 9 for sq in range(81) if squares[sq] == pawn
+                }
+            for to_sq in range(81):
+                if squares[to_sq]:
+                    continue
+                to_rank = _relative_rank(color, to_sq % 9 + 1)
+                if ptype in (PAWN, LANCE) and to_rank == 1:
+                    continue
+                if ptype == KNIGHT and to_rank <= 2:
+                    continue
+                if ptype == PAWN and to_sq // 9 in pawn_files:
+                    continue  # 二歩
+                yield (None, to_sq, False, ptype)
+
+    def is_legal(self, move):
+        """自玉が取られない指し手か（打ち歩詰めも禁止）"""
+        color = self.side
+        captured = self.do_move(move)
+        legal = not self.in_check(color)
+        if legal and move[3] == PAWN and self.in_check():
+            # 打ち歩詰め: 歩を打って王手し、相手に逃げる手がない
+            legal = self.has_legal_move()
+        self.undo_move(move, captured)
+        return legal
+
+    def has_legal_move(self):
+        for move in self.pseudo_moves():
+            if move[3] == PAWN:
+                # 打ち歩詰めの判定は再帰させない（歩を打つ手は玉を取られないかだけ見る）
+                color = self.side
+                captured = self.do_move(move)
+                ok = not self.in_check(color)
+                self.undo_move(move, captured)
+                if ok:
+                    return True
+            elif self.is_legal(move):
+                return True
+        return False
+
+    def legal_moves(self):
+        return [move for move in self.pseudo_moves() if self.is_legal(move)]
+
+    def gives_check(self, move):
+        """その手で相手玉に王手がかかるか"""
+        captured = self.do_move(move)
+        check = self.in_check()
+        self.undo_move(move, captured)
+        return check
+
+    def piece_attacks(self, piece, from_sq, target_sq):
+        """from_sq に置いた piece が target_sq に利くか"""
+        if target_sq in _STEP_TARGETS[piece][from_sq]:
+            return True
+        for ray in _SLIDE_TARGETS[piece][from_sq]:
+            for to_sq in ray:
+                if to_sq == target_sq:
+                    return True
+                if self.squares[to_sq]:
+                    break
+        return False
+
+    def check_moves(self):
+        """王手になる合法手"""
+        color = self.side
+        king_sq = self.king_square(color ^ 1)
+        if king_sq is None:
+            return []
+
+        moves = []
+        for move in self.pseudo_moves():
+            drop = move[3]
+            if drop:
+                # 打つ手は空き王手にならないので、打った駒の利きだけ見ればよい
+                if not self.piece_attacks(make_piece(color, drop), move[1], king_sq):
+                    continue
+            elif not self.gives_check(move):
+                continue
+            if self.is_legal(move):
+                moves.append(move)
+        return moves
+
+    # --- 出力 ---
+
+    def board_sfen(self):
+        rows = []
+        for rank in range(1, 10):
+            row = ""
+            empty = 0
+            for file in range(9, 0, -1):
+                piece = self.squares[square(file, rank)]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    row += str(empty)
+                    empty = 0
+                ptype = piece_type(piece)
+                letter = PIECE_LETTERS[unpromote(ptype)]
+                if ptype > KING:
+                    letter = "+" + letter
+                row += letter if piece_color(piece) == BLACK else letter.lower()
+            if empty:
+                row += str(empty)
+            rows.append(row)
+        return "/".join(rows)
+
+    def hands_sfen(self):
+        text = ""
+        for color in (BLACK, WHITE):
+            for ptype in SFEN_HAND_ORDER:
+                count = self.hands[color][ptype]
+                if not count:
+                    continue
+                letter = PIECE_LETTERS[ptype]
+                if color == WHITE:
+                    letter = letter.lower()
+                text += (str(count) if count > 1 else "") + letter
+        return text or "-"
+
+    def key(self):
+        """手数を除いた局面文字列（同一局面の判定に使う）"""
+        side = "b" if self.side == BLACK else "w"
+        return f"{self.board_sfen()} {side} {self.hands_sfen()}"
+
+    def sfen(self):
+        return f"{self.key()} {self.ply}"
+
+    def position_command(self):
+        """エンジンに送る `position sfen ...` コマンド"""
+        return f"position sfen {self.sfen()}"
+
+
+def compact_position(command):
+    """`position startpos moves ...` を `position sfen ...` に縮める"""
+    return Board.from_position(command).position_command()
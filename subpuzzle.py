@@ -0,0 +1,83 @@
+"""
+採用した問題の詰み手順から、短い詰将棋を取り出す。
+
+N 手詰めの手順を盤上で2手ずつ進めると、攻め方の手番の局面はそれぞれ
+(N-2) 手詰め・(N-4) 手詰め…の候補になる。エンジンは使わず、
+位置キャッシュの判定か、深さを詰み手数に絞った df-pn で余詰めがないかを確かめる。
+"""
+import time
+
+from dfpn_solver import solve_mate
+from position_cache import STATUS_MATE, STATUS_NOMATE, STATUS_TIMEOUT, STATUS_YOZUME
+from shogi_board import Board, compact_position
+
+# === ユーザー設定 ===
+DERIVE_MAX_DEPTH = 7  # df-pn で確かめる最長の手数（これより長い派生問題はキャッシュの判定があるときだけ）
+DERIVE_NODE_LIMIT = 20000  # 派生問題1つあたりの探索ノード数の上限
+
+# キャッシュの判定として信用できる種類（時間切れは使わない）
+SETTLED_STATUSES = (STATUS_MATE, STATUS_YOZUME, STATUS_NOMATE)
+DERIVED_TIER = "derived"  # キャッシュに残す、派生問題の df-pn で調べたという印
+
+
+def iter_sub_positions(position, steps):
+    """手順を2手ずつ進めた局面を (局面, 残りの手順) で返す"""
+    moves = steps.split()
+    board = Board.from_position(position)
+    tokens = position.split()
+    if "moves" not in tokens:
+        tokens.append("moves")
+    for ply in range(0, len(moves) - 2, 2):
+        try:
+            board.push_usi(moves[ply])
+            board.push_usi(moves[ply + 1])
+        except ValueError:
+            return  # 手順が盤面と合わない
+        tokens += moves[ply:ply + 2]
+        yield " ".join(tokens), moves[ply + 2:]
+
+
+def verify_sub_puzzle(position, expected_length, cache=None):
+    """派生局面の (結果, 判定の種類) を返す（確かめられなければ None）"""
+    if cache is not None:
+        entry = cache.get(position)
+        if entry is not None and entry["status"] in SETTLED_STATUSES:
+            return cache.entry_result(entry), entry["status"]
+        if entry is not None and entry.get("tier") == DERIVED_TIER:
+            return None  # 前回 df-pn で決着しなかった
+
+    if expected_length > DERIVE_MAX_DEPTH:
+        return None
+
+    start_time = time.monotonic()
+    status, result = solve_mate(Board.from_position(position), expected_length, DERIVE_NODE_LIMIT)
+    elapsed_ms = int((time.monotonic() - start_time) * 1000)
+    if status not in SETTLED_STATUSES:
+        # ノード数の上限などで決着しなかったことも残し、次回は df-pn をやり直さない。
+        # エンジンの時間切れの記録があれば、その持ち時間は引き継ぐ（エンジンでの再探索の判断を変えない）
+        if cache is not None:
+            time_ms = entry["time_ms"] if entry is not None else 0
+            cache.put(position, (None, None, ""), STATUS_TIMEOUT, time_ms, elapsed_ms, tier=DERIVED_TIER)
+        return None
+    if cache is not None:
+        cache.put(position, result, status, 0, elapsed_ms, tier=DERIVED_TIER)
+    return result, status
+
+
+def derive_sub_puzzles(record, cache=None):
+    """採用した問題のレコードから、余詰めのない短い問題のレコードを返す"""
+    sub_puzzles = []
+    for position, rest in iter_sub_positions(record["board"], record["steps"]):
+        verified = verify_sub_puzzle(position, len(rest), cache)
+        if verified is None:
+            continue
+        (mate1, _, steps_str), status = verified
+        if status != STATUS_MATE:
+            continue
+        sub_puzzles.append({
+            "board": position,
+            "sfen": compact_position(position),
+            "steps": steps_str,
+            "mate_length": mate1,
+        })
+    return sub_puzzles
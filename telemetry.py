@@ -0,0 +1,158 @@
+"""
+探索のテレメトリ（計測値の記録）。
+
+USI の info 行から depth / time / nodes / nps / hashfull を取り出し、
+局面ごとの各段階（局面の変換・送信・探索・解析）の所要時間と一緒に
+メトリクスファイル（.jsonl または .csv）へ1局面1行で書き出す。
+バッチの終わりに集計を Prometheus の textfile 形式でも書き出す
+（node_exporter の textfile collector で読める）。
+"""
+import csv
+import json
+import os
+import time
+from contextlib import contextmanager
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+METRICS_FILE = os.path.join(SCRIPT_DIR, "metrics.jsonl")  # .csv にすると CSV で書く
+PROMETHEUS_FILE = os.path.join(SCRIPT_DIR, "tsume_maker.prom")
+
+# info 行から取り出す項目
+INFO_FIELDS = ("depth", "seldepth", "time", "nodes", "nps", "hashfull")
+# 局面ごとの段階
+SEARCH_PHASES = ("convert", "send", "search", "parse")
+
+ROW_FIELDS = (
+    ("engine", "sfen", "time_ms", "status", "mate_length")
+    + INFO_FIELDS
+    + tuple(f"{phase}_ms" for phase in SEARCH_PHASES)
+)
+
+
+def parse_search_stats(lines):
+    """info 行から探索の統計を取り出す（後の行の値で上書き、depth は最大値）"""
+    stats = dict.fromkeys(INFO_FIELDS)
+    for line in lines:
+        if not line.startswith("info"):
+            continue
+        parts = line.split()
+        for i, token in enumerate(parts[:-1]):
+            if token == "pv":
+                break  # 以降は指し手
+            if token in stats:
+                try:
+                    value = int(parts[i + 1])
+                except ValueError:
+                    continue
+                if token == "depth" and stats["depth"] is not None:
+                    value = max(value, stats["depth"])
+                stats[token] = value
+    return stats
+
+
+class PhaseTimer:
+    """段階ごとの経過時間（秒）を測る"""
+
+    def __init__(self):
+        self.seconds = {}
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+
+    def ms(self, name):
+        return int(self.seconds.get(name, 0.0) * 1000)
+
+
+class Telemetry:
+    """局面ごとの計測値をファイルに書き、バッチ全体の集計を持つ"""
+
+    def __init__(self, metrics_path=METRICS_FILE, prometheus_path=PROMETHEUS_FILE):
+        self.metrics_path = metrics_path
+        self.prometheus_path = prometheus_path
+        self.phase_seconds = {}
+        self.status_counts = {}
+        self.nodes = 0
+        self.hashfull_max = 0
+        self.depth_max = 0
+
+        is_csv = metrics_path.lower().endswith(".csv")
+        write_header = is_csv and not (
+            os.path.exists(metrics_path) and os.path.getsize(metrics_path)
+        )
+        self._file = open(metrics_path, "a", encoding="utf-8", newline="")
+        self._csv = csv.DictWriter(self._file, ROW_FIELDS) if is_csv else None
+        if write_header:
+            self._csv.writeheader()
+
+    def add_phase(self, name, seconds):
+        self.phase_seconds[name] = self.phase_seconds.get(name, 0.0) + seconds
+
+    def record_search(self, engine, sfen, time_ms, status, result, stats, timer):
+        """1回の go mate の計測値を記録する"""
+        for name, seconds in timer.seconds.items():
+            self.add_phase(name, seconds)
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        self.nodes += stats["nodes"] or 0
+        self.hashfull_max = max(self.hashfull_max, stats["hashfull"] or 0)
+        self.depth_max = max(self.depth_max, stats["depth"] or 0)
+
+        row = {
+            "engine": engine,
+            "sfen": sfen,
+            "time_ms": time_ms,
+            "status": status,
+            "mate_length": result[0],
+            **stats,
+            **{f"{phase}_ms": timer.ms(phase) for phase in SEARCH_PHASES},
+        }
+        if self._csv is not None:
+            self._csv.writerow(row)
+        else:
+            self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def prometheus_lines(self):
+        search_seconds = self.phase_seconds.get("search", 0.0)
+        nps = int(self.nodes / search_seconds) if search_seconds else 0
+        lines = [
+            "# HELP tsume_phase_seconds_total Wall-clock time spent in each phase.",
+            "# TYPE tsume_phase_seconds_total counter",
+        ]
+        for name in sorted(self.phase_seconds):
+            lines.append(f'tsume_phase_seconds_total{{phase="{name}"}} {self.phase_seconds[name]:.6f}')
+        lines += [
+            "# HELP tsume_searches_total Engine mate searches by verdict.",
+            "# TYPE tsume_searches_total counter",
+        ]
+        for status in sorted(self.status_counts):
+            lines.append(f'tsume_searches_total{{status="{status}"}} {self.status_counts[status]}')
+        lines += [
+            "# HELP tsume_engine_nodes_total Nodes searched by the engines.",
+            "# TYPE tsume_engine_nodes_total counter",
+            f"tsume_engine_nodes_total {self.nodes}",
+            "# HELP tsume_engine_nps Nodes per second over the whole batch.",
+            "# TYPE tsume_engine_nps gauge",
+            f"tsume_engine_nps {nps}",
+            "# HELP tsume_engine_hashfull_max Highest hashfull (per mille) reported.",
+            "# TYPE tsume_engine_hashfull_max gauge",
+            f"tsume_engine_hashfull_max {self.hashfull_max}",
+            "# HELP tsume_engine_depth_max Deepest search depth reported.",
+            "# TYPE tsume_engine_depth_max gauge",
+            f"tsume_engine_depth_max {self.depth_max}",
+        ]
+        return lines
+
+    def write_prometheus(self):
+        """集計を Prometheus の textfile に書く（途中の状態を読まれないよう置き換えで）"""
+        tmp_path = self.prometheus_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(self.prometheus_lines()) + "\n")
+        os.replace(tmp_path, self.prometheus_path)
+
+    def close(self):
+        self._file.close()
+        self.write_prometheus()
@@ -0,0 +1,38 @@
+import json
+import os
+import sys
+
+import pytest
+
+# リポジトリ直下のモジュールを読み込めるようにする
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import tsume_maker  # noqa: E402
+from shogi_board import compact_position  # noqa: E402
+
+FAKE_ENGINE = os.path.join(ROOT_DIR, "fake_usi_engine.py")
+
+# 偽エンジンに送る局面（初手だけ違う）
+POSITIONS = [
+    f"position startpos moves {moves}"
+    for moves in ("7g7f", "2g2f", "5g5f", "1g1f", "9g9f", "3g3f", "4g4f", "6g6f", "8g8f")
+]
+
+
+@pytest.fixture
+def engine_script(tmp_path, monkeypatch):
+    """局面 → 応答 を FAKE_ENGINE_SCRIPT に書き、偽エンジンで探索するように設定する"""
+    monkeypatch.setattr(tsume_maker, "ENGINE_PATH", FAKE_ENGINE)
+    monkeypatch.setattr(tsume_maker, "DFPN_SCREEN", False)
+    monkeypatch.setattr(tsume_maker, "QUIET", True)
+    monkeypatch.setattr(tsume_maker, "daemon_available", lambda: False)
+
+    def write(entries):
+        path = tmp_path / "script.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for position, entry in entries.items():
+                f.write(json.dumps({"position": compact_position(position), **entry}) + "\n")
+        monkeypatch.setenv("FAKE_ENGINE_SCRIPT", str(path))
+
+    return write
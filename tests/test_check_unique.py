@@ -0,0 +1,33 @@
+"""
+余詰めチェック（tsume_maker.check_unique）。
+
+go mate は詰み手順を1つしか返さないので、初手以外の王手を指して確かめる。
+ここの局面はどれも df-pn で決着するので、エンジンは使わない。
+"""
+import asyncio
+
+import pytest
+
+import tsume_maker
+from position_cache import STATUS_MATE, STATUS_YOZUME
+
+
+@pytest.mark.parametrize("position, mate_length, first_move, expected", [
+    # 1一玉に 1三歩の支えで G*1b だけが詰み
+    ("position sfen 8k/9/8P/9/9/9/9/9/K8 b G 1", 1, "G*1b", STATUS_MATE),
+    # 2三歩もあると G*2b でも詰む
+    ("position sfen 8k/9/7PP/9/9/9/9/9/K8 b G 1", 1, "G*1b", STATUS_YOZUME),
+    (
+        "position sfen 1g2kg2+S/l4nB2/np1+Lp1pP1/3P1+S1+Rp/2ppB1P1P/"
+        "+r3P4/2PG3pL/p3K1G1+l/2S3SN1 b N4p 129",
+        5,
+        "3b4a+",
+        STATUS_MATE,
+    ),
+])
+def test_check_unique(position, mate_length, first_move, expected):
+    status, elapsed_ms = asyncio.run(
+        tsume_maker.check_unique(None, position, mate_length, first_move, 100)
+    )
+    assert status == expected
+    assert elapsed_ms == 0
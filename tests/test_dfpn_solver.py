@@ -0,0 +1,62 @@
+"""
+df-pn（dfpn_solver.py）の詰み判定と詰み手順。
+"""
+import pytest
+
+from dfpn_solver import STATUS_NO_SHORT_MATE, solve_mate
+from position_cache import STATUS_MATE, STATUS_NOMATE, STATUS_YOZUME
+from shogi_board import Board
+
+
+def assert_mating_line(position, steps, mate_length):
+    """手順が mate_length 手で、指し終えた局面が詰んでいることを確かめる"""
+    moves = steps.split()
+    assert len(moves) == mate_length
+    board = Board.from_position(position)
+    for move in moves:
+        board.push_usi(move)
+    assert board.in_check()
+    assert not board.has_legal_move()
+
+
+def test_pv_follows_the_longest_defence():
+    # 玉方が 5a6a で早く詰む手順を選び、3手の手順で5手詰めと答えていた局面
+    position = (
+        "position sfen 1g2kg2+S/l4nB2/np1+Lp1pP1/3P1+S1+Rp/2ppB1P1P/"
+        "+r3P4/2PG3pL/p3K1G1+l/2S3SN1 b N4p 129"
+    )
+    status, (mate_length, _, steps) = solve_mate(Board.from_position(position))
+    assert status == STATUS_MATE
+    assert mate_length == 5
+    assert_mating_line(position, steps, mate_length)
+
+
+@pytest.mark.parametrize("position, mate_length, steps", [
+    ("position sfen 4k4/9/4P4/9/9/9/9/9/4K4 b GS 1", 1, "G*5b"),
+    ("position sfen 7kl/9/6P2/9/9/9/9/9/4K4 b GS 1", 3, "S*3b 2a1b G*2c"),
+])
+def test_known_mates(position, mate_length, steps):
+    status, result = solve_mate(Board.from_position(position))
+    assert status == STATUS_MATE
+    assert result == (mate_length, None, steps)
+    assert_mating_line(position, steps, mate_length)
+
+
+def test_yozume():
+    # G*1b のほか G*2b でも詰む
+    status, (mate_length, mate2, _) = solve_mate(Board.from_position("position sfen 8k/9/7PP/9/9/9/9/9/K8 b G 1"))
+    assert status == STATUS_YOZUME
+    assert mate_length == mate2 == 1
+
+
+@pytest.mark.parametrize("position, max_depth, expected", [
+    # 金2枚だけでは詰まない（7手まで読むと、深さの打ち切りなしで反証できる）
+    ("position sfen 4k4/9/9/9/9/9/9/9/4K4 b 2G 1", 9, STATUS_NOMATE),
+    ("position sfen 4k4/9/9/9/9/9/9/9/4K4 b 2G 1", 5, STATUS_NO_SHORT_MATE),
+    # 飛車1枚では5手以内に詰まない
+    ("position sfen 4k4/9/9/9/9/9/9/9/4K4 b R 1", 5, STATUS_NO_SHORT_MATE),
+])
+def test_no_mate(position, max_depth, expected):
+    status, result = solve_mate(Board.from_position(position), max_depth)
+    assert status == expected
+    assert result == (None, None, "")
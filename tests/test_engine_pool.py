@@ -0,0 +1,29 @@
+"""
+偽 USI エンジン（fake_usi_engine.py）でエンジンプールを試す。
+
+本物の YaneuraOu なしで、局面が複数のエンジンに振り分けられ、
+結果が入力の順に返ることを確かめる。
+"""
+import json
+
+import tsume_maker
+from conftest import POSITIONS
+from telemetry import Telemetry
+
+
+def test_pool_returns_results_in_input_order(engine_script, tmp_path):
+    # 遅延をばらつかせ、終わる順と入力の順を変える
+    engine_script({
+        position: {"mate": i % 4 * 2 + 1, "latency_ms": (len(POSITIONS) - i) * 10}
+        for i, position in enumerate(POSITIONS)
+    })
+    telemetry = Telemetry(str(tmp_path / "metrics.jsonl"), str(tmp_path / "metrics.prom"))
+    try:
+        results = tsume_maker.solve_positions(POSITIONS, pool_size=3, telemetry=telemetry)
+    finally:
+        telemetry.close()
+
+    assert [result[0] for result in results] == [i % 4 * 2 + 1 for i in range(len(POSITIONS))]
+    with open(tmp_path / "metrics.jsonl", "r", encoding="utf-8") as f:
+        engines = {json.loads(line)["engine"] for line in f}
+    assert engines == {"engine0", "engine1", "engine2"}
@@ -0,0 +1,23 @@
+"""
+エンジンが落ちたときの再起動とやり直し（SupervisedEngine）を偽 USI エンジンで試す。
+
+偽エンジンは FAKE_ENGINE_SCRIPT で "crash": true の局面に go mate を送ると異常終了する。
+"""
+import tsume_maker
+from conftest import POSITIONS
+from position_cache import PositionCache
+
+
+def test_crashing_position_does_not_stop_the_batch(engine_script, tmp_path):
+    crash, *others = POSITIONS[:4]
+    engine_script({
+        crash: {"crash": True},
+        **{position: {"mate": 3} for position in others},
+    })
+    cache = PositionCache(str(tmp_path / "cache.jsonl"))
+    results = tsume_maker.solve_positions([crash, *others], pool_size=1, cache=cache)
+
+    # 落ちた局面は結果なし・キャッシュなし（次回やり直す）、残りは再起動したエンジンで調べる
+    assert results[0] is None
+    assert cache.get(crash) is None
+    assert [result[0] for result in results[1:]] == [3] * len(others)
@@ -0,0 +1,51 @@
+"""
+KIF パーサ（kif_parser.py）の往復テスト。
+
+合成棋譜（bench/gen_kif.py）を USI に変換し、その指し手を盤上で指しながら
+KIF の表記に戻して、元の棋譜と同じになることを確かめる。
+"""
+import os
+import random
+import sys
+
+import pytest
+
+from conftest import ROOT_DIR
+from kif_parser import KifParseError, iter_usi_moves, kif_to_position
+from shogi_board import Board
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "bench"))
+
+from gen_kif import generate_game, kif_move_text  # noqa: E402
+
+
+def move_texts(lines):
+    """KIF の指し手の行から表記（７六歩(77) など）だけを取り出す"""
+    return [line[5:].split("   (")[0] for line in lines if line[:4].strip().isdigit()]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_round_trip(seed):
+    lines = generate_game(random.Random(seed), 120)
+    position = kif_to_position(lines)
+
+    board = Board.startpos()
+    last_dst = None
+    texts = []
+    for usi in position.split()[3:]:
+        move = board.usi_to_move(usi)
+        legal = board.legal_moves()
+        assert move in legal
+        texts.append(kif_move_text(board, move, last_dst, set(legal)))
+        board.do_move(move)
+        last_dst = move[1]
+
+    # 投了の行は指し手ではない
+    assert texts == [text for text in move_texts(lines) if text != "投了"]
+
+
+def test_unreadable_move_is_reported_with_line_number():
+    lines = ["手合割：平手", "   1 ７六歩(77)", "   2 ほげ"]
+    with pytest.raises(KifParseError) as excinfo:
+        list(iter_usi_moves(lines))
+    assert excinfo.value.line_no == 3
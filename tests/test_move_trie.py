@@ -0,0 +1,48 @@
+"""
+手順木（move_trie.py）。
+"""
+from move_trie import NO_NODE, MoveTrie
+from shogi_board import Board
+
+GAMES = [
+    "position startpos moves 7g7f 3c3d 2g2f 8c8d",
+    "position startpos moves 7g7f 3c3d 8h2b+",
+    "position startpos moves 2g2f",
+]
+
+
+def build():
+    trie = MoveTrie()
+    for game in GAMES:
+        trie.add(game)
+    return trie
+
+
+def test_games_share_common_moves():
+    trie = build()
+    # 根 + 7g7f 3c3d 2g2f 8c8d + 8h2b+ + 2g2f
+    assert trie.node_count == 7
+    assert [trie.game(game) for game in range(len(trie))] == GAMES
+
+
+def test_walk_gives_each_position_once():
+    trie = build()
+    seen = {}
+    for node, board in trie.walk():
+        seen[node] = board.key()
+    assert len(seen) == trie.node_count
+    for node, key in seen.items():
+        assert Board.from_position(trie.position(node)).key() == key
+
+
+def test_shortest_game_through_each_node():
+    trie = build()
+    node = trie.leaves[1]  # 8h2b+
+    parent = trie.parent[node]  # 3c3d は対局 0 と 1 が通り、短いのは 1
+    assert trie.shortest_game[parent] == 1
+    assert trie.shortest_length[parent] == 3
+
+    trie.recount_shortest({1})
+    assert trie.shortest_game[parent] == 0
+    assert trie.shortest_length[parent] == 4
+    assert trie.shortest_game[node] == NO_NODE
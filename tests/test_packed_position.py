@@ -0,0 +1,50 @@
+"""
+256bit パック形式（packed_position.py）の往復テスト。
+"""
+import os
+import random
+import sys
+
+from conftest import ROOT_DIR
+from packed_position import PackedPuzzles, pack_position, unpack_position, write_packed
+from shogi_board import Board
+
+sys.path.insert(0, os.path.join(ROOT_DIR, "bench"))
+
+from gen_kif import generate_game  # noqa: E402
+from kif_parser import kif_to_position  # noqa: E402
+
+PUZZLE = {
+    "board": (
+        "position sfen 1g2kg2+S/l4nB2/np1+Lp1pP1/3P1+S1+Rp/2ppB1P1P/"
+        "+r3P4/2PG3pL/p3K1G1+l/2S3SN1 b N4p 129"
+    ),
+    "steps": "3b4a+ 5a4a G*5b 4a3b 2c2b+",
+    "mate_length": 5,
+}
+
+
+def test_positions_round_trip():
+    # 成り駒・持ち駒・後手番がひととおり出るよう、合成棋譜の途中の局面を使う
+    for seed in range(5):
+        moves = kif_to_position(generate_game(random.Random(seed), 160)).split()[3:]
+        board = Board.startpos()
+        for move in moves:
+            board.push_usi(move)
+            packed, ply = pack_position(board.position_command())
+            assert len(packed) == 32
+            assert Board.from_sfen(unpack_position(packed, ply)).sfen() == board.sfen()
+
+
+def test_records_round_trip(tmp_path):
+    path = str(tmp_path / "puzzles.bin")
+    # 駒が 40 枚そろっていない局面はパックできないので飛ばす
+    short = {"board": "position sfen 4k4/9/4P4/9/9/9/9/9/4K4 b G 1", "steps": "G*5b", "mate_length": 1}
+    assert write_packed([PUZZLE, short], path) == (1, 1)
+    with PackedPuzzles(path) as puzzles:
+        assert len(puzzles) == 1
+        assert puzzles.mate_length(0) == 5
+        record = puzzles[0]
+    assert record["steps"] == PUZZLE["steps"]
+    assert record["mate_length"] == 5
+    assert Board.from_position(record["board"]).sfen() == Board.from_position(PUZZLE["board"]).sfen()
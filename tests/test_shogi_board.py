@@ -0,0 +1,38 @@
+"""
+盤面と指し手生成（shogi_board.py）の perft。
+
+既知の局面の合法手の数を数え、指し手生成・do_move / undo_move の取りこぼしを見つける。
+"""
+import pytest
+
+from shogi_board import Board
+
+# 「指し手生成祭り」の局面（打ち・成り・王手回避が一通り出る）
+MATSURI = "position sfen l6nl/5+P1gk/2np1S3/p1p4Pp/3P2Sp1/1PPb2P1P/P5GS1/R8/LN4bKL w RGgsn5p 1"
+
+
+def perft(board, depth):
+    """depth 手先までの合法手の並びの数"""
+    if depth == 0:
+        return 1
+    nodes = 0
+    for move in board.legal_moves():
+        captured = board.do_move(move)
+        nodes += perft(board, depth - 1)
+        board.undo_move(move, captured)
+    return nodes
+
+
+@pytest.mark.parametrize("position, depth, expected", [
+    ("position startpos", 1, 30),
+    ("position startpos", 2, 900),
+    ("position startpos", 3, 25470),
+    (MATSURI, 1, 207),
+    (MATSURI, 2, 28684),
+])
+def test_perft(position, depth, expected):
+    board = Board.from_position(position)
+    key = board.key()
+    assert perft(board, depth) == expected
+    # 全部戻せば元の局面
+    assert board.key() == key
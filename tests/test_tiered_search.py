@@ -0,0 +1,21 @@
+"""
+持ち時間の段（MATE_TIME_TIERS_MS）の引き上げを偽 USI エンジンで試す。
+"""
+import tsume_maker
+from conftest import POSITIONS
+from position_cache import STATUS_MATE, PositionCache
+
+
+def test_slow_position_settles_at_longer_tier(engine_script, tmp_path):
+    fast, slow = POSITIONS[:2]
+    engine_script({
+        fast: {"mate": 3, "latency_ms": 0},
+        slow: {"mate": 5, "latency_ms": 300},  # 100ms の段では時間切れ
+    })
+    cache = PositionCache(str(tmp_path / "cache.jsonl"))
+    results = tsume_maker.solve_positions([fast, slow], pool_size=1, cache=cache)
+
+    assert results[1][0] == 5
+    assert cache.get(fast)["tier"] == "100ms"
+    assert cache.get(slow)["tier"] == "1000ms"
+    assert cache.get(slow)["status"] == STATUS_MATE
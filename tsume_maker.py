@@ -1,73 +1,64 @@
+import asyncio
 import os
 import json
-import subprocess
 import time
-import queue
-import threading
 
-# === ユーザー設定 ===
-ENGINE_PATH = "C:\\Users\\hikar\\yaneuraou\\YaneuraOu_NNUE-tournament-clang++-avx2.exe"
-CONVERTED_FILE = "C:\\Users\\hikar\\program_develop\\aoto-tsumeshogi-question\\aoto-tsumeshogi-question\\sfen_maker_1\\output_sfens\\output.sfen"
-
-
-MATE_TIME_MS = 3000
-MULTI_PV = 2
-
-def send_command(engine, cmd):
-    """エンジンにコマンドを送る"""
-    if engine.poll() is not None:
-        return
-    print(f"📝 コマンド送信: {cmd}")
-    engine.stdin.write(cmd + "\n")
-    engine.stdin.flush()
-
-class OutputReader(threading.Thread):
-    """エンジンの出力を並列で読むスレッド"""
-    def __init__(self, engine, out_queue):
-        super().__init__()
-        self.engine = engine
-        self.out_queue = out_queue
-        self.running = True
-
-    def run(self):
-        while self.running:
-            line = self.engine.stdout.readline()
-            if not line:
-                if self.engine.poll() is not None:
-                    break
-                time.sleep(0.01)
-                continue
-            self.out_queue.put(line.strip())
-
-    def stop(self):
-        self.running = False
-
-def wait_for_mate(out_queue, engine, timeout_ms):
-    """詰み探索や通常探索の応答を待つ"""
-    start_time = time.time()
-    lines = []
-
-    while True:
-        if engine.poll() is not None:
-            print("⚠️ エンジンが終了しています。")
-            break
-
-        elapsed = (time.time() - start_time) * 1000
-        if elapsed > timeout_ms:
-            print("⏳ 探索時間超過！強制停止")
-            send_command(engine, "stop")
-            time.sleep(1)
-            break
-
-        try:
-            line = out_queue.get(timeout=0.1)
-        except queue.Empty:
-            continue
+from candidate_extractor import extract_all
+from daemon_client import DAEMON_SOCKET, DaemonError, daemon_available, solve_via_daemon
+from dfpn_solver import STATUS_NO_SHORT_MATE, STATUS_UNKNOWN, mated_after_check, solve_mate
+from move_validator import QUARANTINE_FILE, quarantine, validate_games
+from position_cache import (
+    STATUS_MATE,
+    STATUS_TIMEOUT,
+    STATUS_YOZUME,
+    PositionCache,
+    game_id,
+    position_key,
+    search_status,
+)
+from shogi_board import Board, compact_position, move_to_usi
+from telemetry import PhaseTimer, Telemetry, parse_search_stats
+from puzzle_db import PuzzleDB, import_jsonl
+from subpuzzle import derive_sub_puzzles
+from usi_client import EngineError, SupervisedEngine
 
-        print("🔹", line)
-        lines.append(line)
-
-    return lines
+# === ユーザー設定 ===
+# 環境変数で上書き可能（fake_usi_engine.py を使った動作確認など）
+ENGINE_PATH = os.environ.get(
+    "TSUME_ENGINE_PATH",
+    "C:\\Users\\hikar\\yaneuraou\\YaneuraOu_NNUE-tournament-clang++-avx2.exe",
+)
+CONVERTED_FILE = os.environ.get(
+    "TSUME_CONVERTED_FILE",
+    "C:\\Users\\hikar\\program_develop\\aoto-tsumeshogi-question\\aoto-tsumeshogi-question\\sfen_maker_1\\output_sfens\\output.sfen",
+)
+
+
+# 持ち時間の段（ミリ秒）。短い持ち時間で全局面を調べ、時間切れの局面だけを次の段へ回す
+MATE_TIME_TIERS_MS = (100, 1000, 10000)
+MATE_TIME_MS = MATE_TIME_TIERS_MS[-1]  # 最後の段の持ち時間（キャッシュのやり直し判定に使う）
+# バッチ全体のエンジン探索時間の上限（秒）。使い切ったら次の段へは回さない（None なら無制限）
+BATCH_TIME_BUDGET_S = None
+# 第1段階で詰みの有無だけを調べ、詰んだ局面だけを第2段階で
+# 余詰め（初手以外の王手でも詰むか）を調べる
+CHECK_UNIQUE = True
+# 余詰めを調べる王手1つあたりの df-pn のノード数の上限（決着しなければエンジンで調べる）
+UNIQUE_DFPN_NODE_LIMIT = 3000
+# 各対局の終局から何手分の局面を候補にするか（0 なら最終局面だけを事前チェックなしで調べる）
+CANDIDATE_PLIES = int(os.environ.get("TSUME_CANDIDATE_PLIES", "8"))
+# df-pn で短い詰み・不詰を先に確定させ、決着しない局面だけをエンジンに送る
+DFPN_SCREEN = True
+# エンジンとのやり取りや局面ごとの表示を止める（集計だけ表示）
+QUIET = os.environ.get("TSUME_QUIET", "0") == "1"
+# 局面ごとの計測値を metrics.jsonl と tsume_maker.prom に書き出す
+WRITE_METRICS = True
+# 採用した問題の詰み手順を2手ずつ進めた局面からも短い問題を取り出す（エンジンは使わない）
+DERIVE_SUBPUZZLES = True
+
+# === エンジンプール設定 ===
+ENGINE_POOL_SIZE = int(os.environ.get("TSUME_ENGINE_POOL_SIZE", "1"))  # 同時に起動するエンジン数
+ENGINE_THREADS_TOTAL = os.cpu_count() or 1  # 全エンジン合計のスレッド数
+ENGINE_HASH_TOTAL_MB = 256  # 全エンジン合計の置換表サイズ(MB)
 
 def parse_mate_info(lines):
     """詰み情報を解析し、詰み手数と手順を取得"""
@@ -91,112 +82,508 @@ def parse_mate_info(lines):
             except ValueError:
                 pass
 
+        # info 行が無く "checkmate <手順>" だけ返ってきた場合
+        elif line.startswith("checkmate ") and 1 not in mate_dict:
+            moves = line.split()[1:]
+            if moves and moves[0] not in ("nomate", "timeout", "notimplemented"):
+                mate_dict[1] = len(moves)
+                mate_steps = " ".join(moves)
+
     return mate_dict.get(1), mate_dict.get(2), mate_steps
 
+async def start_engine(name, threads, hash_mb):
+    """エンジンを起動し、usiok / readyok を待って初期化する"""
+    # 落ちたり固まったりしたら、同じ設定で自動的に再起動される
+    engine = SupervisedEngine(ENGINE_PATH, name, {
+        "Threads": threads,
+        "MultiPV": 1,
+        "USI_Hash": hash_mb,
+        "USI_OwnBook": "false",
+    }, verbose=not QUIET)
+    await engine.launch()
+    print(f"✅ [{name}] エンジン初期化完了")
+
+    return engine
+
+async def run_queue(engines, task_queue, handler, stop=None):
+    """各エンジンがキューから局面を取り出して handler(engine, idx, sfen) を呼ぶ
+
+    局面を取り出す前に stop() を呼び、真ならそこでやめる（残りはキューに残る）。
+    """
+    async def worker(engine):
+        while not task_queue.empty():
+            if stop is not None and stop():
+                return
+            idx, sfen = task_queue.get_nowait()
+            await handler(engine, idx, sfen)
+
+    await asyncio.gather(*(worker(engine) for engine in engines))
+
+async def check_mate(engine, sfen, time_ms=MATE_TIME_MS, telemetry=None):
+    """局面をエンジンに渡して time_ms ミリ秒まで詰みを調べる
+
+    ((詰み手数, 次善手の詰み手数, 手順), 判定の種類, 探索時間ms) を返す。
+    telemetry (Telemetry) を渡すと、info 行の統計と各段階の時間を記録する。
+    """
+    if not QUIET:
+        print(f"\n🔍 [{engine.name}] 処理中の局面: {sfen}")
+
+    timer = PhaseTimer()
+    # エンジンに局面をセットして詰みチェック（長い手順は短い SFEN に縮める）
+    with timer.phase("convert"):
+        command = compact_position(sfen)
+    with timer.phase("send"):
+        await engine.position(command)
+    with timer.phase("search"):
+        lines_captured = await engine.go_mate(time_ms)
+
+    with timer.phase("parse"):
+        result = parse_mate_info(lines_captured)
+        status = search_status(lines_captured, result)
+    if telemetry is not None:
+        stats = parse_search_stats(lines_captured)
+        telemetry.record_search(engine.name, command, time_ms, status, result, stats, timer)
+    return result, status, timer.ms("search")
+
+async def mated_by_engine(engine, board, max_depth, time_ms, telemetry=None):
+    """王手を指した局面（玉方の手番）で、玉方のどの応手にも max_depth 手以内に詰むかを go mate で調べる
+
+    (True / False / None（時間切れで分からない）, 探索時間ms) を返す。
+    """
+    elapsed_ms = 0
+    for move in board.legal_moves():
+        captured = board.do_move(move)
+        command = board.position_command()
+        board.undo_move(move, captured)
+        (mate, _, _), status, search_ms = await check_mate(engine, command, time_ms, telemetry)
+        elapsed_ms += search_ms
+        if status == STATUS_TIMEOUT:
+            return None, elapsed_ms
+        if mate is None or mate > max_depth - 1:
+            return False, elapsed_ms
+    return True, elapsed_ms
+
+async def check_unique(engine, sfen, mate1, first_move, time_ms, telemetry=None):
+    """初手 first_move 以外の王手でも mate1 手以内に詰むか（余詰め）を調べる
+
+    go mate は詰み手順を1つしか返さないので、初手以外の王手を1つずつ指して確かめる。
+    王手ごとにまず df-pn（スレッドで）で調べ、決着しなければ玉方の応手ごとにエンジンで調べる。
+    (判定の種類, エンジンの探索時間ms) を返す。判定の種類は STATUS_YOZUME（余詰めあり）・
+    STATUS_MATE（唯一解）・STATUS_TIMEOUT（調べきれない王手があった）のどれか。
+    """
+    board = Board.from_position(sfen)
+    elapsed_ms = 0
+    unsettled = False
+    for move in board.check_moves():
+        if move_to_usi(move) == first_move:
+            continue
+        captured = board.do_move(move)
+        after = board.copy()
+        board.undo_move(move, captured)
+        mated = await asyncio.to_thread(mated_after_check, after, mate1 - 1, UNIQUE_DFPN_NODE_LIMIT)
+        if mated is None:
+            mated, search_ms = await mated_by_engine(engine, after, mate1 - 1, time_ms, telemetry)
+            elapsed_ms += search_ms
+        if mated:
+            return STATUS_YOZUME, elapsed_ms
+        if mated is None:
+            unsettled = True
+    return (STATUS_TIMEOUT if unsettled else STATUS_MATE), elapsed_ms
+
+def drain_queue(task_queue):
+    """キューに残った局面を取り出してリストで返す"""
+    items = []
+    while not task_queue.empty():
+        items.append(task_queue.get_nowait())
+    return items
+
+def screen_position(sfen):
+    """df-pn で局面を調べ、確定したら (結果, 判定の種類, 探索時間ms) を返す（未確定は None）"""
+    start_time = time.monotonic()
+    status, result = solve_mate(Board.from_position(sfen))
+    elapsed_ms = int((time.monotonic() - start_time) * 1000)
+
+    if status in (STATUS_NO_SHORT_MATE, STATUS_UNKNOWN):
+        return None
+    return result, status, elapsed_ms
+
+def engine_resources(pool_size):
+    """エンジン1台あたりの (Threads, USI_Hash MB)"""
+    threads = max(1, ENGINE_THREADS_TOTAL // pool_size)
+    hash_mb = max(1, ENGINE_HASH_TOTAL_MB // pool_size)
+    return threads, hash_mb
+
+async def search_positions(engines, items, record, telemetry=None):
+    """起動済みのエンジンで [(idx, sfen), ...] を調べる
+
+    MATE_TIME_TIERS_MS の短い段から順に調べ、時間切れの局面だけを次の段へ回す
+    （BATCH_TIME_BUDGET_S を使い切ったらそこで打ち切る）。決着するたびに
+    record(idx, sfen, 結果, 判定の種類, 持ち時間ms, 探索時間ms) を呼ぶ。
+    エンジンを再起動してやり直しても調べられなかった局面は record せず、
+    (idx, sfen) のリストで返す（キャッシュに残らないので次回また調べる）。
+    """
+    failed = []
+    budget_ms = None if BATCH_TIME_BUDGET_S is None else BATCH_TIME_BUDGET_S * 1000
+    spent_ms = 0
+    # 第1段階で詰みが見つかった局面 → (結果, 持ち時間ms, 探索時間ms)
+    phase1_mates = {}
+    unique_items = []  # 第2段階で余詰めを調べる [(idx, sfen), ...]
+    task_queue = asyncio.Queue()
+
+    def over_budget():
+        return budget_ms is not None and spent_ms >= budget_ms
+
+    async def phase1(engine, idx, sfen, time_ms, is_last_tier, promoted):
+        nonlocal spent_ms
+        try:
+            result, status, elapsed_ms = await check_mate(engine, sfen, time_ms, telemetry)
+        except EngineError as e:
+            print(f"⚠️ [{engine.name}] この局面は調べられませんでした: {e}")
+            failed.append((idx, sfen))
+            return
+        spent_ms += elapsed_ms
+        if status == STATUS_TIMEOUT and not is_last_tier:
+            promoted.append((idx, sfen))
+            return
+        if status == STATUS_MATE and CHECK_UNIQUE:
+            phase1_mates[idx] = (result, time_ms, elapsed_ms)
+            unique_items.append((idx, sfen))
+            return
+        record(idx, sfen, result, status, time_ms, elapsed_ms)
+
+    async def phase2(engine, idx, sfen, promoted):
+        nonlocal spent_ms
+        (mate1, _, steps_str), time_ms, elapsed1_ms = phase1_mates[idx]
+        # 詰みが見つかったのと同じ段の持ち時間で、ほかの王手からの詰みを調べる
+        try:
+            status, elapsed2_ms = await check_unique(
+                engine, sfen, mate1, steps_str.split()[0], time_ms, telemetry
+            )
+        except EngineError as e:
+            print(f"⚠️ [{engine.name}] この局面は調べられませんでした: {e}")
+            failed.append((idx, sfen))
+            return
+        spent_ms += elapsed2_ms
+        elapsed_ms = elapsed1_ms + elapsed2_ms
+        if status == STATUS_TIMEOUT:
+            # ほかの王手を調べきれなかった。唯一解か分からないので採用せず、
+            # 次の段の持ち時間で調べ直す（最後の段なら時間切れとして残す）
+            longer = [t for t in MATE_TIME_TIERS_MS if t > time_ms]
+            if longer:
+                phase1_mates[idx] = ((mate1, None, steps_str), longer[0], elapsed_ms)
+                promoted.append((idx, sfen))
+            else:
+                record(idx, sfen, (None, None, ""), STATUS_TIMEOUT, time_ms, elapsed_ms)
+            return
+        mate2 = mate1 if status == STATUS_YOZUME else None
+        record(idx, sfen, (mate1, mate2, steps_str), status, time_ms, elapsed_ms)
+
+    # 第1段階: 詰みの有無だけ。短い持ち時間の段から順に
+    pending = list(items)
+    last_time_ms = 0
+    cut = 0  # 探索時間の上限で打ち切った局面数
+    for tier, time_ms in enumerate(MATE_TIME_TIERS_MS):
+        if not pending or over_budget():
+            break
+        print(f"⏱️ 持ち時間 {time_ms}ms: {len(pending)} 局面")
+        is_last_tier = tier == len(MATE_TIME_TIERS_MS) - 1
+        promoted = []
+        for item in pending:
+            task_queue.put_nowait(item)
+        await run_queue(
+            engines,
+            task_queue,
+            lambda engine, idx, sfen: phase1(engine, idx, sfen, time_ms, is_last_tier, promoted),
+            stop=over_budget,
+        )
+        # 上限に達してこの段では送らなかった局面は、前の段の持ち時間での時間切れとして残す
+        for idx, sfen in drain_queue(task_queue):
+            record(idx, sfen, (None, None, ""), STATUS_TIMEOUT, last_time_ms, 0)
+            cut += 1
+        pending = sorted(promoted)
+        last_time_ms = time_ms
+
+    # 次の段へ回せなかった局面は、最後に試した持ち時間での時間切れとして残す
+    for idx, sfen in pending:
+        record(idx, sfen, (None, None, ""), STATUS_TIMEOUT, last_time_ms, 0)
+        cut += 1
+
+    # 第2段階: 詰んだ局面だけ余詰めを調べる
+    if unique_items:
+        print(f"🔁 余詰めチェック: {len(unique_items)} 局面")
+        pending = sorted(unique_items)
+        while pending:
+            promoted = []
+            for item in pending:
+                task_queue.put_nowait(item)
+            await run_queue(
+                engines,
+                task_queue,
+                lambda engine, idx, sfen: phase2(engine, idx, sfen, promoted),
+                stop=over_budget,
+            )
+            # 上限に達して余詰めを調べられなかった局面は採用せず、次回やり直す（持ち時間 0）
+            for idx, sfen in drain_queue(task_queue):
+                record(idx, sfen, (None, None, ""), STATUS_TIMEOUT, 0, 0)
+                cut += 1
+            pending = sorted(promoted)
+
+    if cut:
+        print(f"⏳ 探索時間の上限に達しました: {cut} 局面は時間切れのまま")
+    return failed
+
+async def solve_positions_async(
+    sfen_list, pool_size=ENGINE_POOL_SIZE, on_result=None, cache=None, telemetry=None, engines=None
+):
+    """複数のエンジンで局面を並列に調べ、入力順の結果リストを返す
+
+    on_result(idx, sfen, result) を渡すと、結果が出るたびにすぐ呼ばれる。
+    cache (PositionCache) を渡すと、解析済みの局面はエンジンに送らず
+    キャッシュの結果を使う（on_result は呼ばれない）。
+    DFPN_SCREEN が有効なら、df-pn で決着した局面もエンジンに送らない。
+    engine_daemon が起動していれば、エンジンを起動せずデーモンに局面を送る。
+    telemetry (Telemetry) を渡すと、探索ごとの計測値を記録する。
+    engines に起動済みのエンジンを渡すと、新しく起動せずにそれを使う（終了もしない）。
+    """
+    results = [None] * len(sfen_list)
+    cached = screened = 0
+
+    items = []
+    for idx, sfen in enumerate(sfen_list):
+        if cache is not None and not cache.needs_search(sfen, MATE_TIME_MS):
+            results[idx] = cache.entry_result(cache.get(sfen))
+            cached += 1
+            continue
+
+        if DFPN_SCREEN:
+            start_time = time.perf_counter()
+            settled = screen_position(sfen)
+            if telemetry is not None:
+                telemetry.add_phase("dfpn", time.perf_counter() - start_time)
+            if settled is not None:
+                results[idx], status, elapsed_ms = settled
+                screened += 1
+                if cache is not None:
+                    cache.put(sfen, results[idx], status, 0, elapsed_ms, tier="dfpn")
+                if on_result is not None:
+                    on_result(idx, sfen, results[idx])
+                continue
+
+        items.append((idx, sfen))
+
+    if cache is not None:
+        print(f"♻️ 解析済み {cached} 局面をスキップ")
+    if DFPN_SCREEN:
+        print(f"🧮 df-pn で {screened} 局面を確定")
+    if not items:
+        return results
+
+    # 段ごとに決着した局面数（持ち時間ms → 局面数）
+    tier_counts = {}
+    # エンジンの異常で調べられなかった局面 [(idx, sfen), ...]
+    failed = []
+
+    def record(idx, sfen, result, status, time_ms, elapsed_ms):
+        results[idx] = result
+        tier_counts[time_ms] = tier_counts.get(time_ms, 0) + 1
+        if cache is not None:
+            cache.put(sfen, result, status, time_ms, elapsed_ms, tier=f"{time_ms}ms")
+        if on_result is not None:
+            on_result(idx, sfen, result)
+
+    if daemon_available():
+        print(f"🔌 エンジンデーモンで探索: {DAEMON_SOCKET}")
+        try:
+            failed.extend(await solve_via_daemon(items, record))
+        except (OSError, DaemonError) as e:
+            # デーモンが落ちていれば、残りはこのプロセスでエンジンを起動して調べる
+            print(f"⚠️ エンジンデーモンを使えません: {e}")
+        failed_idx = {idx for idx, _ in failed}
+        items = [
+            (idx, sfen) for idx, sfen in items if results[idx] is None and idx not in failed_idx
+        ]
+
+    if items and engines is not None:
+        failed.extend(await search_positions(engines, items, record, telemetry))
+    elif items:
+        pool_size = max(1, min(pool_size, len(items)))
+        threads, hash_mb = engine_resources(pool_size)
+        print(f"🚀 エンジン {pool_size} 台で探索 (Threads={threads}, USI_Hash={hash_mb}MB)")
+
+        engines = await asyncio.gather(
+            *(start_engine(f"engine{i}", threads, hash_mb) for i in range(pool_size))
+        )
+        try:
+            failed.extend(await search_positions(engines, items, record, telemetry))
+        finally:
+            await asyncio.gather(*(engine.quit() for engine in engines))
+        restarts = sum(engine.restarts for engine in engines)
+        if restarts:
+            retries = sum(engine.retries for engine in engines)
+            print(f"🔄 エンジン再起動 {restarts} 回、局面のやり直し {retries} 回")
+
+    for time_ms in sorted(tier_counts):
+        print(f"📊 持ち時間 {time_ms}ms で決着: {tier_counts[time_ms]} 局面")
+    if failed:
+        print(f"💥 エンジンの異常で調べられなかった局面: {len(failed)}（キャッシュせず次回やり直す）")
+
+    return results
+
+def solve_positions(sfen_list, pool_size=ENGINE_POOL_SIZE, on_result=None, cache=None, telemetry=None):
+    """solve_positions_async の同期版"""
+    return asyncio.run(solve_positions_async(sfen_list, pool_size, on_result, cache, telemetry))
+
+def store_puzzle(db, record, source_game, position_hash):
+    """問題を DB に加える。すでに DB にある問題なら False"""
+    if position_hash in db:
+        return False
+    db.add(record, source_game=source_game, position_hash=position_hash)
+    return True
+
+def derive_all(accepted, cache):
+    """新しく加えた問題 [(レコード, 元の対局, 局面ハッシュ), ...] の手順の途中から取り出した問題を
+    [(レコード, 元の対局, 元の問題の局面ハッシュ), ...] で返す（DERIVE_SUBPUZZLES でなければ空）
+
+    df-pn で確かめるので時間がかかる。探索中のイベントループの中では呼ばず、
+    探索が終わってから（またはスレッドで）呼ぶこと。
+    """
+    if not DERIVE_SUBPUZZLES:
+        return []
+    return [
+        (sub_record, source_game, position_hash)
+        for record, source_game, position_hash in accepted
+        for sub_record in derive_sub_puzzles(record, cache)
+    ]
+
+def make_record(sfen, result, verbose=True):
+    """探索結果を判定し、保存するレコードを返す（不採用なら None）"""
+    mate1, mate2, steps_str = result
+    verbose = verbose and not QUIET
+    if verbose:
+        print(f"\n📋 局面: {sfen}")
+        print(f"   最善手の詰み手数: {mate1}, 次善手の詰み手数: {mate2}")
+
+    if mate1 is None:
+        if verbose:
+            print("🔔 この局面では詰みなし → スキップ")
+        return None
+
+    if mate2 is not None and mate1 == mate2:
+        if verbose:
+            print("⚠️ 余詰め発生 → スキップ")
+        return None
+
+    return {
+        "board": sfen,
+        "sfen": compact_position(sfen),
+        "steps": steps_str,
+        "mate_length": mate1,
+    }
+
 def main():
     if not os.path.exists(CONVERTED_FILE):
         print(f"⚠️ {CONVERTED_FILE} が見つかりません。スクリプトを終了します。")
         return  # スクリプトを停止
 
-    engine_dir = os.path.dirname(ENGINE_PATH)
-    if engine_dir:
-        os.chdir(engine_dir)
-
-    engine = subprocess.Popen(
-        [ENGINE_PATH],
-        stdin=subprocess.PIPE,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1
-    )
-
-    out_queue = queue.Queue()
-    reader = OutputReader(engine, out_queue)
-    reader.start()
-
-    # --- エンジン初期化 ---
-    send_command(engine, "usi")
-    send_command(engine, f"setoption name MultiPV value {MULTI_PV}")
-    send_command(engine, "setoption name USI_Hash value 256")
-    send_command(engine, "setoption name USI_OwnBook value false")
-    send_command(engine, "isready")
-    print("✅ エンジン初期化完了")
-
-    # === SFENリストを一行ずつ処理 ===
+    # === SFENリストを読み込む ===
+    # 終盤の各手から候補局面を取り出し、明らかに詰まない局面を落とす
+    # （対局は1行ずつ手順木に入れるので、全対局の手順の文字列を同時には持たない）
+    extract_start = time.perf_counter()
+    sources = {}  # 候補局面 → 元の対局
     with open(CONVERTED_FILE, "r", encoding="utf-8") as f:
-        sfen_list = f.readlines()
+        if CANDIDATE_PLIES:
+            sfen_list = extract_all(f, CANDIDATE_PLIES, sources)
+            print(f"🧩 候補局面: {len(sfen_list)}")
+        else:
+            sfen_list, quarantined = validate_games(f)
+            if quarantined:
+                added = quarantine(quarantined)
+                print(f"🚧 不正な手のある {len(quarantined)} 局を除きました（{QUARANTINE_FILE} に新しく {added} 局）")
+    extract_seconds = time.perf_counter() - extract_start
 
     if not sfen_list:
         print("⚠️ SFENが空です。処理を終了します。")
         return
 
-    # JSONファイルのパス
-    SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-    OUTPUT_JSON = os.path.join(SCRIPT_DIR, "tsumeshogi.json")
-
-    # 既存のJSONファイルを読み込む（なければ空リスト）
-    if os.path.exists(OUTPUT_JSON):
-        with open(OUTPUT_JSON, "r", encoding="utf-8") as f:
-            try:
-                existing_data = json.load(f)
-                if not isinstance(existing_data, list):
-                    existing_data = [existing_data]
-            except json.JSONDecodeError:
-                existing_data = []
-    else:
-        existing_data = []
-
+    valid_sfens = []
+    seen_keys = {}  # 局面ハッシュ → 最初に見つかった手順
     for sfen in sfen_list:
         sfen = sfen.strip()
-        if not sfen.startswith("position startpos moves"):
+        if not sfen.startswith(("position startpos", "position sfen")):
             print(f"⚠️ 無効なSFEN: {sfen}")
             continue
-
-        print(f"\n🔍 処理中の局面: {sfen}")
-
-        # エンジンに局面をセット
-        send_command(engine, sfen)
-
-        # 詰みチェック
-        send_command(engine, f"go mate {MATE_TIME_MS}")
-        lines_captured = wait_for_mate(out_queue, engine, MATE_TIME_MS + 1000)
-
-        mate1, mate2, steps_str = parse_mate_info(lines_captured)
-        print(f"   最善手の詰み手数: {mate1}, 次善手の詰み手数: {mate2}")
-
-        if mate1 is None:
-            print("🔔 この局面では詰みなし → スキップ")
+        try:
+            key = position_key(sfen)
+        except ValueError as e:
+            print(f"⚠️ 無効なSFEN: {sfen} ({e})")
             continue
-
-        if mate2 is not None and mate1 == mate2:
-            print("⚠️ 余詰め発生 → スキップ")
+        # 手順が違っても同じ局面なら1回だけ調べる
+        if key in seen_keys:
             continue
+        seen_keys[key] = sfen
+        valid_sfens.append(sfen)
+    position_hashes = {sfen: key for key, sfen in seen_keys.items()}
 
-        # 記録更新
-        final_record = {
-            "board": sfen,
-            "steps": steps_str,
-            "mate_length": mate1,
-        }
-        existing_data.append(final_record)
+    if not valid_sfens:
+        print("⚠️ 有効なSFENがありません。処理を終了します。")
+        return
 
-        print(f"📜 保存データ: {json.dumps(final_record, indent=2, ensure_ascii=False)}")
+    db = PuzzleDB()
+    if not len(db):
+        # 以前の tsumeshogi.jsonl / tsumeshogi.json があれば取り込んでおく
+        import_jsonl(db)
+    imported = db.inserted
+
+    reported = set()
+    accepted = []  # 新しく加えた問題（探索が終わってから派生問題を取り出す）
+    # 解析済みの局面はキャッシュから（中断したバッチの再開もこれで行う）
+    cache = PositionCache()
+
+    def save_puzzle(sfen, record):
+        source_game = game_id(sources.get(sfen, sfen))
+        if store_puzzle(db, record, source_game, position_hashes[sfen]):
+            accepted.append((record, source_game, position_hashes[sfen]))
+
+    def save_result(idx, sfen, result):
+        reported.add(idx)
+        record = make_record(sfen, result)
+        if record is None:
+            return
+        # 見つけたら DB に書き込む（BATCH_SIZE 件ごとにまとめて INSERT）
+        save_puzzle(sfen, record)
+        if not QUIET:
+            print(f"📜 保存データ: {json.dumps(record, ensure_ascii=False)}")
+
+    telemetry = None
+    if WRITE_METRICS:
+        telemetry = Telemetry()
+        telemetry.add_phase("extract", extract_seconds)
 
-    # JSONファイルに保存
     try:
-        with open(OUTPUT_JSON, "w", encoding="utf-8") as f:
-            json.dump(existing_data, f, indent=2, ensure_ascii=False)
-        print(f"✨ JSON保存完了: {OUTPUT_JSON}")
-    except Exception as e:
-        print(f"❌ JSON保存エラー: {e}")
-
-    # エンジン終了処理
-    send_command(engine, "quit")
-    reader.stop()
-    engine.wait()
-    print("✅ エンジン終了")
+        results = solve_positions(valid_sfens, on_result=save_result, cache=cache, telemetry=telemetry)
+
+        # キャッシュから読んだ局面も入れておく（前回中断したときに書き込み待ちだった問題の救済。
+        # すでに入っている局面は store_puzzle で飛ばす）
+        for idx, (sfen, result) in enumerate(zip(valid_sfens, results)):
+            if idx in reported or result is None or position_hashes[sfen] in db:
+                continue
+            record = make_record(sfen, result, verbose=False)
+            if record is not None:
+                save_puzzle(sfen, record)
+
+        for sub_record, source_game, parent_hash in derive_all(accepted, cache):
+            db.add(sub_record, source_game=source_game, parent_hash=parent_hash)
+    finally:
+        db.close()
+        if telemetry is not None:
+            telemetry.close()
+            print(f"📈 計測値: {telemetry.metrics_path} / {telemetry.prometheus_path}")
+
+    # 実際に新しく入った件数（すでにあった局面は数えない）
+    derived = db.inserted_derived
+    if derived:
+        print(f"🌱 詰み手順の途中から {derived} 問を取り出しました")
+    print(f"✨ {db.inserted - imported - derived} 件を保存しました（JSON配列は python puzzle_db.py export で作成）")
 
 if __name__ == "__main__":
     main()
-
@@ -0,0 +1,87 @@
+"""
+詰将棋データの追記専用 JSONL ストア。
+
+tsume_maker は問題を puzzle_db（SQLite）に書き込むようになったので、
+ここは以前の tsumeshogi.jsonl / tsumeshogi.json の読み込み・移行と
+JSONL への追記（位置キャッシュなど）に使う。tsumeshogi.jsonl にはもう問題が増えないので、
+JSON配列は puzzles.db から作る（export は python puzzle_db.py export と同じ）:
+
+    python tsume_store.py migrate   # tsumeshogi.json → tsumeshogi.jsonl
+    python tsume_store.py export    # puzzles.db → tsumeshogi.json
+"""
+import json
+import os
+import sys
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TSUME_JSONL = os.path.join(SCRIPT_DIR, "tsumeshogi.jsonl")
+TSUME_JSON = os.path.join(SCRIPT_DIR, "tsumeshogi.json")
+
+
+def append_record(record, jsonl_path=TSUME_JSONL):
+    """1件を JSONL に追記し、fsync してディスクに確定させる"""
+    line = json.dumps(record, ensure_ascii=False)
+    with open(jsonl_path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def iter_records(jsonl_path=TSUME_JSONL):
+    """JSONL を1件ずつ読む（クラッシュで途切れた行は読み飛ばす）"""
+    if not os.path.exists(jsonl_path):
+        return
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"⚠️ 壊れた行をスキップ: {jsonl_path}:{line_no}")
+
+
+def migrate_json(json_path=TSUME_JSON, jsonl_path=TSUME_JSONL):
+    """既存の tsumeshogi.json を JSONL に移す（JSONL がまだ無いときだけ）"""
+    if os.path.exists(jsonl_path) or not os.path.exists(json_path):
+        return 0
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        try:
+            data = json.load(f)
+        except json.JSONDecodeError:
+            print(f"⚠️ {json_path} を読み込めませんでした。移行をスキップします。")
+            return 0
+    if not isinstance(data, list):
+        data = [data]
+
+    tmp_path = jsonl_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for record in data:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, jsonl_path)
+
+    print(f"📦 {json_path} から {len(data)} 件を {jsonl_path} に移行しました")
+    return len(data)
+
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("export", "migrate"):
+        print("使い方: python tsume_store.py [export|migrate]")
+        return
+
+    if sys.argv[1] == "migrate":
+        migrate_json()
+    else:
+        # puzzle_db はこのモジュールを読み込むので、ここで読み込む
+        from puzzle_db import PuzzleDB, export_json
+
+        with PuzzleDB() as db:
+            export_json(db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+asyncio ベースの USI クライアント。
+
+ポーリングするスレッドやキューを使わず、1つのイベントループで
+複数のエンジンを同時に動かせる。
+"""
+import asyncio
+import os
+import sys
+
+STOP_GRACE_MS = 1000  # stop 送信後に終了応答を待つ時間
+MAX_RETRIES = 2  # 1局面あたり、エンジンを再起動してやり直す回数の上限
+
+
+class EngineError(Exception):
+    """エンジンが終了した・応答しないなどの異常"""
+
+
+def engine_command(engine_path):
+    """エンジン起動コマンドを組み立てる（.py ならPythonで実行）"""
+    if engine_path.endswith(".py"):
+        return [sys.executable, engine_path]
+    return [engine_path]
+
+
+def is_search_end(line):
+    """探索終了を表す応答 (checkmate ... / bestmove ...) かどうか"""
+    return line.startswith("checkmate") or line.startswith("bestmove")
+
+
+class USIEngine:
+    """1つのエンジンプロセスとの USI 通信"""
+
+    def __init__(self, engine_path, name="engine", verbose=True):
+        self.engine_path = engine_path
+        self.name = name
+        self.verbose = verbose  # False ならコマンドと出力行を表示しない
+        self.proc = None
+        self.engine_name = None
+        self.options = []
+
+    async def start(self):
+        """エンジンプロセスを起動する"""
+        engine_dir = os.path.dirname(self.engine_path)
+        self.proc = await asyncio.create_subprocess_exec(
+            *engine_command(self.engine_path),
+            cwd=engine_dir or None,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.returncode is None
+
+    async def send(self, cmd):
+        """エンジンにコマンドを送る"""
+        if not self.alive:
+            raise EngineError(f"{self.name}: エンジンが終了しています")
+        if self.verbose:
+            print(f"📝 [{self.name}] コマンド送信: {cmd}")
+        try:
+            self.proc.stdin.write((cmd + "\n").encode("utf-8"))
+            await self.proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError) as e:
+            raise EngineError(f"{self.name}: コマンド送信に失敗しました: {e}") from e
+
+    async def readline(self, timeout=None):
+        """エンジンの出力を1行読む。タイムアウト時は None"""
+        try:
+            raw = await asyncio.wait_for(self.proc.stdout.readline(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if not raw:
+            raise EngineError(f"{self.name}: エンジンが終了しています")
+        return raw.decode("utf-8", errors="replace").strip()
+
+    async def read_until(self, predicate, timeout):
+        """predicate を満たす行が来るまで読み、それまでの行を返す"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        lines = []
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise EngineError(f"{self.name}: 応答がありません")
+            line = await self.readline(remaining)
+            if line is None:
+                continue
+            lines.append(line)
+            if predicate(line):
+                return lines
+
+    async def usi(self, timeout=10):
+        """usi を送り usiok を待つ"""
+        await self.send("usi")
+        lines = await self.read_until(lambda l: l == "usiok", timeout)
+        for line in lines:
+            if line.startswith("id name "):
+                self.engine_name = line[len("id name "):]
+            elif line.startswith("option name "):
+                self.options.append(line.split()[2])
+        return lines
+
+    async def setoption(self, name, value):
+        await self.send(f"setoption name {name} value {value}")
+
+    async def isready(self, timeout=60):
+        """isready を送り readyok を待つ（評価関数の読み込みを含む）"""
+        await self.send("isready")
+        await self.read_until(lambda l: l == "readyok", timeout)
+
+    async def usinewgame(self):
+        await self.send("usinewgame")
+
+    async def position(self, sfen):
+        """局面をセットする（"position ..." の形式でも SFEN だけでもよい）"""
+        if not sfen.startswith("position"):
+            sfen = f"position sfen {sfen}"
+        await self.send(sfen)
+
+    async def go_mate(self, time_ms):
+        """go mate を送り、探索終了までの出力行を返す"""
+        await self.send(f"go mate {time_ms}")
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + time_ms / 1000 + 1
+        stop_sent = False
+        lines = []
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                if stop_sent:
+                    raise EngineError(f"{self.name}: stop 後も応答がありません")
+                # エンジンが時間内に答えなかった場合のみ stop を送る
+                if self.verbose:
+                    print(f"⏳ [{self.name}] 探索時間超過！強制停止")
+                await self.send("stop")
+                stop_sent = True
+                deadline = loop.time() + STOP_GRACE_MS / 1000
+                continue
+
+            line = await self.readline(remaining)
+            if line is None:
+                continue
+
+            if self.verbose:
+                print(f"🔹 [{self.name}]", line)
+            lines.append(line)
+
+            if is_search_end(line):
+                break
+
+        return lines
+
+    async def quit(self, timeout=5):
+        """エンジンを終了させる"""
+        if self.alive:
+            try:
+                await self.send("quit")
+                await asyncio.wait_for(self.proc.wait(), timeout)
+            except (EngineError, asyncio.TimeoutError):
+                self.proc.kill()
+                await self.proc.wait()
+        print(f"✅ [{self.name}] エンジン終了")
+
+
+class SupervisedEngine(USIEngine):
+    """落ちた・固まったエンジンを自動で再起動する USIEngine
+
+    setoption した値を覚えておき、再起動時に usi / setoption / isready /
+    usinewgame をやり直してから、探索中だった局面だけをもう一度調べる。
+    """
+
+    def __init__(self, engine_path, name="engine", options=None, verbose=True):
+        super().__init__(engine_path, name, verbose)
+        self.init_options = dict(options or {})
+        self.last_position = None
+        self.restarts = 0
+        self.retries = 0
+
+    async def launch(self):
+        """起動して初期化する（usi → setoption → isready → usinewgame）"""
+        await self.start()
+        await self.usi()
+        for name, value in self.init_options.items():
+            await super().setoption(name, value)
+        await self.isready()
+        await self.usinewgame()
+
+    async def restart(self):
+        """プロセスを止めて起動し直す"""
+        if self.alive:
+            self.proc.kill()
+            await self.proc.wait()
+        self.restarts += 1
+        print(f"🔄 [{self.name}] エンジンを再起動します（{self.restarts} 回目）")
+        await self.launch()
+
+    async def setoption(self, name, value):
+        self.init_options[name] = value
+        await super().setoption(name, value)
+
+    async def position(self, sfen):
+        self.last_position = sfen
+        if not self.alive:
+            await self.restart()
+        await super().position(sfen)
+
+    async def go_mate(self, time_ms):
+        """go mate。落ちた・固まったら再起動して同じ局面をやり直す
+
+        MAX_RETRIES 回やり直しても（再起動に失敗した場合も含めて）だめなら EngineError。
+        """
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                if attempt:
+                    self.retries += 1
+                    await self.restart()
+                    if self.last_position is not None:
+                        await super().position(self.last_position)
+                return await super().go_mate(time_ms)
+            except EngineError as e:
+                print(f"💥 [{self.name}] {e}")
+                error = e
+        raise error